@@ -3,5 +3,10 @@ This file is a part of the 'ecs-pygame' source code.
 The source code is distributed under the MIT license.
 """
 
-from game.utils.animation import Animation
+import os
+
+# Keeps stdout clean for the tools that print JSON to it
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from game.utils.animation import Animation, AnimationTable
 from game.utils.sprites import get_images
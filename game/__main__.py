@@ -3,21 +3,27 @@ This file is a part of the 'ecs-pygame' source code.
 The source code is distributed under the MIT license.
 """
 
+import argparse
 import json
 import logging
+import random
+import time
+from typing import Optional
 
-import esper
 import pygame
 
-from game.components import Frames, Movement, PlayerData, Pos, Rectangle, Sword
+from game.components import Pos, SkeletonSpawnerTile
 from game.enums import GameStates
-from game.generics import EventInfo
-from game.processors import (CollisionProcessor, EntityProcessor,
-                             InputProcessor, MovementProcessor,
-                             RenderProcessor)
+from game.generics import FrameContext
+from game.processors import LightingProcessor, RenderProcessor
+from game.sim import Simulation
 from game.states import Level
-from game.utils.animation import Animation
-from game.utils.maps import load_map
+from game.utils.classes import Glow
+from game.utils.governor import FrameGovernor
+from game.utils.lighting import LightMap
+from game.utils.memory import MemoryTracker
+from game.utils.profiler import ProcessorProfiler
+from game.utils.recording import InputRecorder
 from game.utils.sprites import load_assets
 
 logger = logging.getLogger()
@@ -29,24 +35,83 @@ class Game:
     """
 
     CAP_FPS = 120
-    DISPLAY_RES = (416, 336)
-    TILE_SIZE = 16
+    TICK_RATE = Simulation.TICK_RATE
+    DISPLAY_RES = Simulation.VIEW_SIZE
+    DISPLAY_FLAGS = pygame.SCALED
+    PROFILER_KEY = pygame.K_F3
+    MEMORY_KEY = pygame.K_F4
+    TILE_SIZE = Simulation.TILE_SIZE
+    # Keep skeleton positions and velocities in numpy arrays (needs numpy)
+    ARRAY_STORE = False
+    # Most skeletons alive at once, None for no limit
+    MAX_SKELETONS = 2000
+    # Radius and colour of the lights on spawners and skeletons
+    TORCH_LIGHT = (56, (255, 140, 50))
+    SKELETON_LIGHT = (20, (40, 70, 140))
+    # Frame governor levels from which optional work is cut down
+    SLOW_DISTANT_ANIMATION_LEVEL = 1
+    SKIP_LIGHTING_LEVEL = 2
+    DELAY_SPAWNS_LEVEL = 3
+    DISTANT_ANIMATION_STRIDE = 2
+    SPAWN_SLOWDOWN = 1.5
 
-    def __init__(self):
+    def __init__(
+        self,
+        level_map: Optional[list[str]] = None,
+        profile: bool = False,
+        trace_path: Optional[str] = None,
+        tick_rate: int = TICK_RATE,
+        dirty_rects: bool = False,
+        record_path: Optional[str] = None,
+        seed: Optional[int] = None,
+        lighting: bool = False,
+        governor: bool = True,
+        memory_path: Optional[str] = None,
+    ):
         self.logging_config()
+        self.trace_path = trace_path
+        self.memory_path = memory_path
+        if memory_path is not None:
+            MemoryTracker.start_tracing()
+        # Seeded, so that a recording of the session replays the same way
+        self.seed = random.randrange(2**32) if seed is None else seed
+        random.seed(self.seed)
+        self.tick_rate = tick_rate
+        self.dirty_rects = dirty_rects
+        self.lighting = lighting
 
-        self.world = esper.World()
-        self.screen = pygame.display.set_mode(self.DISPLAY_RES, pygame.SCALED)
+        self.screen = pygame.display.set_mode(
+            self.DISPLAY_RES, self.DISPLAY_FLAGS
+        )
         pygame.init()
         self.state = GameStates.LEVEL
         self.assets = load_assets(self.state.value, self.screen)
 
-        with open("assets/data/level_0.json") as f:
-            level_map = json.load(f)
-        load_map(
-            self.world, level_map, self.assets["tile_set"], self.TILE_SIZE
-        )
+        if level_map is None:
+            with open("assets/data/level_0.json") as f:
+                level_map = json.load(f)
+        self.level_map = level_map
         self.selective_load()
+        if profile or trace_path:
+            self.profiler.enable()
+        self.memory = (
+            None
+            if memory_path is None
+            else MemoryTracker(self.world, self.assets)
+        )
+
+        self.recorder = None
+        if record_path is not None:
+            self.recorder = InputRecorder(
+                record_path,
+                self.seed,
+                tick_rate,
+                level_map,
+                self.MAX_SKELETONS,
+                self.simulation.motion_store is not None,
+            )
+
+        self.governor = FrameGovernor(1 / self.CAP_FPS) if governor else None
 
         self.clock = pygame.time.Clock()
 
@@ -63,31 +128,40 @@ class Game:
         if self.state == GameStates.MAIN_MENU:
             pass
         elif self.state == GameStates.LEVEL:
-            self.player = self.world.create_entity(
-                Pos(70, 50),
-                Movement(),
-                Rectangle((70, 50), self.assets["player"][0].get_size()),
-                PlayerData(speed=0.7),
-                Frames(
-                    Animation(self.assets["player"], speed=0.05),
-                    blit_by="midbottom",
-                ),
-                Sword(
-                    image=self.assets["sword"].copy(),
-                    pos=Pos(70, 50),
-                ),
+            self.simulation = Simulation(
+                self.assets,
+                self.level_map,
+                self.MAX_SKELETONS,
+                self.ARRAY_STORE,
+                self.tick_rate,
+                self.DISPLAY_RES,
             )
+            self.world = self.simulation.world
+            self.player = self.simulation.player
+            self.camera = self.simulation.camera
+            self.quit_events = self.simulation.events.subscribe(pygame.QUIT)
+            self.key_presses = self.simulation.events.subscribe(pygame.KEYDOWN)
 
-            self.entity_processor = EntityProcessor(self.assets)
-            self.input_processor = InputProcessor()
-            self.movement_processor = MovementProcessor()
-            self.collision_processor = CollisionProcessor()
-            self.render_processor = RenderProcessor()
-            self.world.add_processor(self.entity_processor, priority=4)
-            self.world.add_processor(self.input_processor, priority=3)
-            self.world.add_processor(self.collision_processor, priority=2)
-            self.world.add_processor(self.movement_processor, priority=1)
-            self.world.add_processor(self.render_processor)
+            self.render_processor = RenderProcessor(
+                self.simulation.movement_processor,
+                self.simulation.animations,
+                self.simulation.spatial_index,
+                self.dirty_rects,
+            )
+            # Rendering runs once per frame, outside the simulation ticks
+            self.render_processor.world = self.world
+            self.render_context = FrameContext(self.screen)
+            self.lighting_processor = None
+            if self.lighting:
+                self.add_lights()
+            self.profiler = ProcessorProfiler(
+                (
+                    *self.simulation.processors,
+                    self.render_processor,
+                    *filter(None, (self.lighting_processor,)),
+                ),
+                trace=self.trace_path is not None,
+            )
 
             self.current_state = Level(self.world, self.player)
         elif self.state == GameStates.DEATH_SCREEN:
@@ -95,35 +169,201 @@ class Game:
         else:
             raise ValueError(f"No such state '{self.state}' exists!")
 
+    def add_lights(self):
+        """
+        Lights the spawners up like torches and makes skeletons glow.
+        """
+        self.lighting_processor = LightingProcessor(
+            self.simulation.movement_processor,
+            self.render_processor,
+            LightMap(self.DISPLAY_RES),
+        )
+        self.lighting_processor.world = self.world
+
+        torch = Glow(*self.TORCH_LIGHT)
+        for entity, (tile,) in self.world.query(SkeletonSpawnerTile):
+            centre = tile.image.get_rect(topleft=tile.pos).center
+            self.world.add_component(entity, Pos(centre))
+            self.world.add_component(entity, torch)
+
+        entity_processor = self.simulation.entity_processor
+        bounds = entity_processor.skeleton_bounds
+        entity_processor.skeleton_glow = Glow(
+            *self.SKELETON_LIGHT, offset=(bounds.width / 2, bounds.height / 2)
+        )
+
+    @property
+    def degradation_level(self) -> int:
+        return 0 if self.governor is None else self.governor.level
+
+    def degrade(self, level: int):
+        """
+        Cuts optional work down to what the governor's `level` calls for.
+        """
+        self.render_processor.distant_stride = (
+            self.DISTANT_ANIMATION_STRIDE
+            if level >= self.SLOW_DISTANT_ANIMATION_LEVEL
+            else 1
+        )
+        self.simulation.entity_processor.set_spawn_slowdown(
+            self.SPAWN_SLOWDOWN if level >= self.DELAY_SPAWNS_LEVEL else 1.0
+        )
+        logger.info(f"Frame governor at level {level}")
+
+    def handle_events(self):
+        if self.quit_events:
+            self.quit()
+        for event in self.key_presses:
+            if event.key == self.PROFILER_KEY:
+                self.profiler.toggle()
+            elif event.key == self.MEMORY_KEY and self.memory is not None:
+                self.log_memory()
+        self.key_presses.clear()
+
+    def log_memory(self):
+        report = self.memory.report()
+        heap = report["heap"]
+        logger.info(
+            f"{report['entities']} entities,"
+            f" {heap['current'] / 1024:.0f} KiB heap,"
+            f" {heap['per_entity']:.0f} B heap"
+            f" and {report['bytes_per_entity']:.0f} B of components"
+            " per entity"
+        )
+        for stat in heap["top_lines"][:3]:
+            logger.info(f"  {stat['growth']:+d} B at {stat['where']}")
+
+    def run_frame(self, raw_dt: float, events, keys, mouse_pos):
+        """
+        Dispatches the frame's events, runs as many fixed simulation ticks
+        as `raw_dt` seconds add up to, then renders once with positions
+        interpolated between the last two ticks.
+        """
+        self.simulation.events.dispatch(events)
+        self.handle_events()
+        # The mouse is over the last frame's view of the world
+        mouse_pos = self.camera.to_world(mouse_pos)
+        if self.recorder is not None:
+            self.recorder.record(
+                raw_dt,
+                keys,
+                mouse_pos,
+                events,
+                self.simulation.entity_processor.spawn_slowdown,
+            )
+        self.simulation.advance(raw_dt, keys, mouse_pos)
+
+        context = self.render_context
+        context.dt = raw_dt * self.CAP_FPS
+        context.raw_dt = raw_dt
+        context.alpha = self.simulation.alpha
+        context.keys = keys
+        context.mouse_pos = mouse_pos
+        self.render_processor.process(context)
+        if (
+            self.lighting_processor is not None
+            and self.degradation_level < self.SKIP_LIGHTING_LEVEL
+        ):
+            self.lighting_processor.process(context)
+
     def process(self):
 
-        dt, raw_dt = 0, 0
+        raw_dt = 0
         while True:
+            frame_start = time.perf_counter()
             events = pygame.event.get()
             keys = pygame.key.get_pressed()
             mouse_pos = pygame.mouse.get_pos()
 
-            event_info = {
-                "screen": self.screen,
-                "dt": dt,
-                "raw dt": raw_dt,
-                "keys": keys,
-                "mouse pos": mouse_pos,
-                "events": events,
-            }
-            for event in events:
-                if event.type == pygame.QUIT:
-                    raise SystemExit
+            self.run_frame(raw_dt, events, keys, mouse_pos)
+            if self.profiler.enabled:
+                self.profiler.draw(self.screen)
+                self.render_processor.invalidate()
+            work_time = time.perf_counter() - frame_start
 
-            self.screen.fill((25, 25, 25))
+            raw_dt = self.clock.tick(self.CAP_FPS) / 1000
+            display_start = time.perf_counter()
+            self.update_display()
+            work_time += time.perf_counter() - display_start
 
-            self.world.process(event_info)
+            if self.governor is not None:
+                if self.governor.end_frame(work_time):
+                    self.degrade(self.governor.level)
+                self.profiler.metrics["level"] = self.governor.level
+            self.profiler.end_frame()
 
-            raw_dt = self.clock.tick(self.CAP_FPS) / 1000
-            dt = raw_dt * self.CAP_FPS
+    def update_display(self):
+        dirty = self.render_processor.dirty
+        if dirty is None:
             pygame.display.flip()
+        else:
+            pygame.display.update(dirty)
+
+    def quit(self):
+        if self.recorder is not None:
+            self.recorder.close(self.simulation.digest())
+        if self.trace_path is not None:
+            self.profiler.write_trace(self.trace_path)
+            logger.info(f"Wrote trace to {self.trace_path}")
+        if self.memory is not None:
+            with open(self.memory_path, "w") as f:
+                json.dump(self.memory.report(), f, indent=4)
+            logger.info(f"Wrote memory report to {self.memory_path}")
+        raise SystemExit
 
 
 if __name__ == "__main__":
-    game = Game()
+    parser = argparse.ArgumentParser(prog="python -m game")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Show the processor timings overlay, toggled with F3",
+    )
+    parser.add_argument(
+        "--trace", help="Write a Chrome trace of processor timings on exit"
+    )
+    parser.add_argument(
+        "--tick-rate",
+        type=int,
+        default=Game.TICK_RATE,
+        help="Simulation ticks per second",
+    )
+    parser.add_argument(
+        "--dirty-rects",
+        action="store_true",
+        help="Only redraw and update the screen where sprites moved",
+    )
+    parser.add_argument(
+        "--record",
+        help="Record inputs to this file, replay with python -m game.replay",
+    )
+    parser.add_argument("--seed", type=int, help="Seed the RNG")
+    parser.add_argument(
+        "--no-governor",
+        action="store_true",
+        help="Always do all the work, even when frames run long",
+    )
+    parser.add_argument(
+        "--lighting",
+        action="store_true",
+        help="Light the level with torches and glowing skeletons",
+    )
+    parser.add_argument(
+        "--memory-report",
+        help="Trace allocations and write memory use per component type"
+        " and asset on exit, F4 logs it while playing",
+    )
+    args = parser.parse_args()
+
+    game = Game(
+        profile=args.profile,
+        trace_path=args.trace,
+        tick_rate=args.tick_rate,
+        dirty_rects=args.dirty_rects,
+        record_path=args.record,
+        seed=args.seed,
+        lighting=args.lighting,
+        governor=not args.no_governor,
+        memory_path=args.memory_report,
+    )
     game.process()
@@ -0,0 +1,325 @@
+"""
+This file is a part of the 'ecs-pygame' source code.
+The source code is distributed under the MIT license.
+
+Runs seeded headless simulations across a process pool for balance
+tuning, and streams one line of metrics per run to a JSONL or CSV file.
+Every combination of the given tuning values is run once per seed.
+
+    python -m game.batch --runs 100 --gen-time 6 8.3 --output runs.csv
+"""
+
+import argparse
+import csv
+import dataclasses
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from game.components import (Pos, Rectangle, Skeleton, SkeletonSpawnerTile,
+                             Sword)
+from game.enums import GameStates
+from game.generics import Assets
+from game.processors import EntityProcessor
+from game.sim import Simulation
+from game.utils.sprites import load_assets
+
+logger = logging.getLogger()
+
+TICK_RATE = Simulation.TICK_RATE
+
+# Loaded once per worker process
+_assets: Optional[Assets] = None
+
+
+@dataclass
+class RunConfig:
+    seed: int
+    ticks: int
+    policy: str = "ai"
+    level: str = "assets/data/level_0.json"
+    gen_time: float = SkeletonSpawnerTile.SKELETON_GEN_TIME
+    skeleton_speed: tuple[float, float] = EntityProcessor.SKELETON_SPEED
+    piercing_speed: float = Sword.PIERCING_SPEED
+
+
+class ScriptedPolicy:
+    """
+    Walks in a random direction that changes every second and thrusts at
+    a random point around the player every half second.
+    """
+
+    DIRECTION_TICKS = TICK_RATE
+    THRUST_TICKS = TICK_RATE // 2
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.keys = defaultdict(bool)
+
+    def __call__(self, simulation: Simulation, tick: int):
+        pos = simulation.world.component_for_entity(simulation.player, Pos)
+        if tick % self.DIRECTION_TICKS == 0:
+            self.keys.clear()
+            for key in (pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d):
+                self.keys[key] = self.rng.random() < 0.3
+
+        angle = self.rng.uniform(0, math.tau)
+        mouse_pos = pos.x + math.cos(angle) * 40, pos.y + math.sin(angle) * 40
+        return self.keys, mouse_pos, tick % self.THRUST_TICKS == 0
+
+
+class AIPolicy:
+    """
+    Aims at the nearest skeleton and thrusts once it is in reach, backing
+    away from it while the sword is out.
+    """
+
+    SIGHT = 160
+    FLEE_DISTANCE = 48
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    def nearest_skeleton(self, simulation: Simulation, pos: Pos):
+        rows = simulation.world.query(Skeleton, Rectangle).rows
+        sight = pygame.Rect(0, 0, self.SIGHT * 2, self.SIGHT * 2)
+        sight.center = pos
+        nearest, nearest_distance = None, math.inf
+        index = simulation.collision_processor.skeleton_index
+        for entity in index.query(sight):
+            centre = rows[entity][1].center
+            distance = math.dist(centre, pos)
+            if distance < nearest_distance:
+                nearest, nearest_distance = centre, distance
+        return nearest, nearest_distance
+
+    def __call__(self, simulation: Simulation, tick: int):
+        world = simulation.world
+        pos = world.component_for_entity(simulation.player, Pos)
+        sword = world.component_for_entity(simulation.player, Sword)
+        keys = defaultdict(bool)
+
+        target, distance = self.nearest_skeleton(simulation, pos)
+        if target is None:
+            angle = self.rng.uniform(0, math.tau)
+            mouse_pos = pos.x + math.cos(angle), pos.y + math.sin(angle)
+            return keys, mouse_pos, False
+
+        if sword.piercing and distance < self.FLEE_DISTANCE:
+            keys[pygame.K_a] = target[0] > pos.x
+            keys[pygame.K_d] = target[0] < pos.x
+            keys[pygame.K_w] = target[1] > pos.y
+            keys[pygame.K_s] = target[1] < pos.y
+        clicked = not sword.piercing and distance < sword.MAX_DISTANCE
+        return keys, target, clicked
+
+
+POLICIES: dict[str, Callable[[random.Random], Callable]] = {
+    "scripted": ScriptedPolicy,
+    "ai": AIPolicy,
+}
+
+
+def _init_worker(quiet: bool = True):
+    global _assets
+    if quiet:
+        logging.getLogger().setLevel("WARNING")
+    _assets = load_assets(GameStates.LEVEL.value)
+
+
+def run_simulation(config: RunConfig) -> dict:
+    """
+    Runs one session headless, as fast as it goes.
+
+    :return: The config and the metrics of the run
+    """
+    start = time.perf_counter()
+    random.seed(config.seed)
+    rng = random.Random(config.seed)
+
+    with open(config.level) as f:
+        level_map = json.load(f)
+    simulation = Simulation(
+        _assets,
+        level_map,
+        gen_time=config.gen_time,
+        skeleton_speed=config.skeleton_speed,
+        piercing_speed=config.piercing_speed,
+    )
+    policy = POLICIES[config.policy](rng)
+    player_rect = simulation.world.component_for_entity(
+        simulation.player, Rectangle
+    )
+    skeleton_index = simulation.collision_processor.skeleton_index
+    skeletons = simulation.world.query(Skeleton, Rectangle).rows
+
+    peak_alive = touched_ticks = 0
+    first_touch = None
+    for tick in range(config.ticks):
+        keys, mouse_pos, clicked = policy(simulation, tick)
+        if clicked:
+            simulation.events.dispatch(
+                (
+                    pygame.event.Event(
+                        pygame.MOUSEBUTTONDOWN, pos=mouse_pos, button=1
+                    ),
+                )
+            )
+        simulation.step(keys, mouse_pos)
+
+        peak_alive = max(peak_alive, len(skeletons))
+        reach = player_rect.inflate(
+            skeleton_index.cell_size * 2, skeleton_index.cell_size * 2
+        )
+        if any(
+            player_rect.colliderect(skeletons[entity][1])
+            for entity in skeleton_index.query(reach)
+        ):
+            touched_ticks += 1
+            if first_touch is None:
+                first_touch = tick
+
+    entity_processor = simulation.entity_processor
+    wall_time = time.perf_counter() - start
+    return {
+        **dataclasses.asdict(config),
+        "spawned": entity_processor.spawned,
+        "killed": entity_processor.killed,
+        "alive": len(skeletons),
+        "peak_alive": peak_alive,
+        "touched_ticks": touched_ticks,
+        "first_touch_tick": first_touch,
+        "wall_s": wall_time,
+        "ticks_per_s": config.ticks / wall_time,
+    }
+
+
+def iter_configs(args: argparse.Namespace) -> Iterator[RunConfig]:
+    for gen_time, piercing_speed, seed in itertools.product(
+        args.gen_time,
+        args.piercing_speed,
+        range(args.seed, args.seed + args.runs),
+    ):
+        yield RunConfig(
+            seed=seed,
+            ticks=args.ticks,
+            policy=args.policy,
+            level=args.level,
+            gen_time=gen_time,
+            skeleton_speed=tuple(args.skeleton_speed),
+            piercing_speed=piercing_speed,
+        )
+
+
+class ResultWriter:
+    """
+    Writes each result as soon as it arrives, as JSON lines or CSV.
+    """
+
+    def __init__(self, f, fmt: str):
+        self.f = f
+        self.fmt = fmt
+        self.csv_writer = None
+
+    def write(self, result: dict):
+        if self.fmt == "jsonl":
+            self.f.write(json.dumps(result) + "\n")
+        else:
+            row = {
+                key: json.dumps(value) if isinstance(value, tuple) else value
+                for key, value in result.items()
+            }
+            if self.csv_writer is None:
+                self.csv_writer = csv.DictWriter(self.f, fieldnames=row)
+                self.csv_writer.writeheader()
+            self.csv_writer.writerow(row)
+        self.f.flush()
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m game.batch", description=__doc__.split("\n\n")[1]
+    )
+    parser.add_argument("--runs", type=int, default=100, help="Seeds to run")
+    parser.add_argument("--seed", type=int, default=0, help="First seed")
+    parser.add_argument(
+        "--ticks", type=int, default=TICK_RATE * 60, help="Ticks per run"
+    )
+    parser.add_argument("--policy", choices=POLICIES, default="ai")
+    parser.add_argument("--level", default=RunConfig.level)
+    parser.add_argument(
+        "--gen-time",
+        type=float,
+        nargs="+",
+        default=[RunConfig.gen_time],
+        help="Seconds between skeleton spawns",
+    )
+    parser.add_argument(
+        "--piercing-speed",
+        type=float,
+        nargs="+",
+        default=[RunConfig.piercing_speed],
+    )
+    parser.add_argument(
+        "--skeleton-speed",
+        type=float,
+        nargs=2,
+        default=RunConfig.skeleton_speed,
+        metavar=("MIN", "MAX"),
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Processes to run in, defaults to one per core",
+    )
+    parser.add_argument("--output", required=True)
+    parser.add_argument(
+        "--format",
+        choices=("jsonl", "csv"),
+        help="Defaults to the output's file extension",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level="INFO")
+    fmt = args.format or ("csv" if args.output.endswith(".csv") else "jsonl")
+    configs = list(iter_configs(args))
+    # Fills the asset cache once, so the workers only read it
+    load_assets(GameStates.LEVEL.value)
+
+    start = time.perf_counter()
+    with open(args.output, "w", newline="") as f:
+        writer = ResultWriter(f, fmt)
+        if args.workers == 1:
+            _init_worker(quiet=False)
+            for result in map(run_simulation, configs):
+                writer.write(result)
+        else:
+            with multiprocessing.Pool(
+                args.workers, initializer=_init_worker
+            ) as pool:
+                for result in pool.imap_unordered(run_simulation, configs):
+                    writer.write(result)
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"{len(configs)} runs in {elapsed:.1f}s,"
+        f" {len(configs) / elapsed:.2f} runs/s on {args.workers} workers"
+    )
+
+
+if __name__ == "__main__":
+    main()
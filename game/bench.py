@@ -0,0 +1,264 @@
+"""
+This file is a part of the 'ecs-pygame' source code.
+The source code is distributed under the MIT license.
+
+Headless benchmark of the game loop. Runs scripted scenarios for a fixed
+number of frames with a fixed dt and a seeded RNG, then prints the
+timings as JSON.
+
+    python -m game.bench --frames 600 --skeletons 1000 --output bench.json
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from game.__main__ import Game
+from game.utils.profiler import ProcessorProfiler
+
+
+@dataclass
+class Scenario:
+    name: str
+    skeletons: int = 0
+    # Generated map size in tiles, None uses level_0
+    map_size: Optional[tuple[int, int]] = None
+    swing: bool = False
+    # Walk the player around, so the flow field follows it
+    walk: bool = False
+
+
+class HeadlessGame(Game):
+    DISPLAY_FLAGS = 0
+    MAX_SKELETONS = None
+
+    def logging_config(self):
+        logging.basicConfig()
+        logging.getLogger().setLevel("WARNING")
+
+
+class ArrayStoreGame(HeadlessGame):
+    ARRAY_STORE = True
+
+
+def generate_map(
+    width: int, height: int, rng: random.Random, wall_chance: float = 0.06
+) -> list[str]:
+    """
+    :return: Level rows in the same format as `assets/data/*.json`, walled
+    in, with scattered walls and spawners and a clear area for the player
+    """
+    rows = []
+    for row in range(height):
+        tiles = []
+        for col in range(width):
+            if row in (0, height - 1) or col in (0, width - 1):
+                tile = "x"
+            elif col < 8 and row < 8:
+                tile = "."
+            else:
+                roll = rng.random()
+                if roll < wall_chance:
+                    tile = "x"
+                elif roll < wall_chance + 0.002:
+                    tile = "s"
+                else:
+                    tile = "."
+            tiles.append(tile + " ")
+        rows.append("".join(tiles))
+    return rows
+
+
+def floor_positions(level_map: list[str], tile_size: int) -> list[tuple]:
+    return [
+        (col * tile_size, row * tile_size)
+        for row, line in enumerate(level_map)
+        for col, tile in enumerate(line.split(" ")[:-1])
+        if tile == "."
+    ]
+
+
+# Directions the walking player cycles through, held for WALK_FRAMES each
+WALK_KEYS = (
+    (pygame.K_d,),
+    (pygame.K_d, pygame.K_s),
+    (pygame.K_s,),
+    (pygame.K_a,),
+    (pygame.K_w,),
+)
+WALK_FRAMES = 90
+
+
+def percentile(samples: list[float], percent: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+    return ordered[index]
+
+
+def run_scenario(
+    scenario: Scenario,
+    frames: int,
+    seed: int,
+    dt: float,
+    tick_rate: int,
+    array_store: bool = False,
+) -> dict:
+    rng = random.Random(seed)
+    random.seed(seed)
+
+    level_map = None
+    if scenario.map_size is not None:
+        level_map = generate_map(*scenario.map_size, rng)
+    game_class = ArrayStoreGame if array_store else HeadlessGame
+    game = game_class(level_map, tick_rate=tick_rate)
+
+    if level_map is None:
+        with open("assets/data/level_0.json") as f:
+            level_map = json.load(f)
+    spawn_points = floor_positions(level_map, game.TILE_SIZE)
+    for _ in range(scenario.skeletons):
+        game.simulation.entity_processor.spawn_skeleton(
+            rng.choice(spawn_points)
+        )
+
+    profiler = ProcessorProfiler(game.profiler.processors, window=frames)
+    profiler.enable()
+
+    keys = defaultdict(bool)
+    centre = pygame.Vector2(game.DISPLAY_RES) / 2
+    frame_times = []
+    for frame in range(frames):
+        events = []
+        mouse_pos = centre
+        if scenario.walk and frame % WALK_FRAMES == 0:
+            keys.clear()
+            for key in WALK_KEYS[frame // WALK_FRAMES % len(WALK_KEYS)]:
+                keys[key] = True
+        if scenario.swing:
+            angle = frame * 0.05
+            mouse_pos = centre + (math.cos(angle) * 80, math.sin(angle) * 80)
+            if frame % 30 == 0:
+                events.append(
+                    pygame.event.Event(
+                        pygame.MOUSEBUTTONDOWN, pos=mouse_pos, button=1
+                    )
+                )
+
+        start = time.perf_counter()
+        game.run_frame(dt / game.CAP_FPS, events, keys, tuple(mouse_pos))
+        game.update_display()
+        frame_times.append(time.perf_counter() - start)
+
+    total = sum(frame_times)
+    return {
+        **asdict(scenario),
+        "frames": frames,
+        "seed": seed,
+        "dt": dt,
+        "tick_rate": tick_rate,
+        "array_store": game.simulation.motion_store is not None,
+        "entities": game.world.entity_count,
+        "total_s": total,
+        "fps": frames / total,
+        "frame_ms": {
+            "mean": statistics.fmean(frame_times) * 1000,
+            "p50": percentile(frame_times, 50) * 1000,
+            "p90": percentile(frame_times, 90) * 1000,
+            "p99": percentile(frame_times, 99) * 1000,
+            "max": max(frame_times) * 1000,
+        },
+        "processors_ms": {
+            name: {"total": sum(stats.samples) * 1000, **timings}
+            for (name, timings), stats in zip(
+                profiler.report().items(), profiler.stats.values()
+            )
+        },
+    }
+
+
+def get_scenarios(args: argparse.Namespace) -> dict[str, Scenario]:
+    return {
+        "level": Scenario("level", swing=True),
+        "skeletons": Scenario("skeletons", skeletons=args.skeletons),
+        "large_map": Scenario(
+            "large_map",
+            skeletons=args.skeletons,
+            map_size=(args.map_size, args.map_size),
+        ),
+        "swing": Scenario("swing", skeletons=args.skeletons, swing=True),
+        "walk": Scenario(
+            "walk",
+            skeletons=args.skeletons,
+            map_size=(args.map_size, args.map_size),
+            walk=True,
+        ),
+    }
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m game.bench", description=__doc__.split("\n\n")[1]
+    )
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--dt", type=float, default=1.0, help="Frame dt, 1 is 1/CAP_FPS s"
+    )
+    parser.add_argument("--tick-rate", type=int, default=Game.TICK_RATE)
+    parser.add_argument("--skeletons", type=int, default=500)
+    parser.add_argument("--map-size", type=int, default=200)
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=("level", "skeletons", "large_map", "swing", "walk"),
+        help="Can be repeated, runs all scenarios by default",
+    )
+    parser.add_argument(
+        "--array-store",
+        action="store_true",
+        help="Keep skeleton motion in numpy arrays",
+    )
+    parser.add_argument("--output", help="Write the JSON here, not stdout")
+    args = parser.parse_args(argv)
+
+    scenarios = get_scenarios(args)
+    results = {
+        "python": sys.version.split()[0],
+        "pygame": pygame.version.ver,
+        "scenarios": [
+            run_scenario(
+                scenarios[name],
+                args.frames,
+                args.seed,
+                args.dt,
+                args.tick_rate,
+                args.array_store,
+            )
+            for name in args.scenario or scenarios
+        ],
+    }
+
+    report = json.dumps(results, indent=4)
+    if args.output is None:
+        print(report)
+    else:
+        with open(args.output, "w") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
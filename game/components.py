@@ -3,35 +3,50 @@ This file is a part of the 'ecs-pygame' source code.
 The source code is distributed under the MIT license.
 """
 
-from dataclasses import dataclass as component
+from dataclasses import dataclass
+from typing import Optional
 
 import pygame
 
 from game.generics import Vec
-from game.utils.animation import Animation
-from game.utils.classes import Time
+from game.utils.sprites import RotationCache
+
+# Components are slotted, thousands of them are alive at once
+component = dataclass(slots=True)
 
 
 class Rectangle(pygame.Rect):
-    pass
+    __slots__ = ()
 
 
 class Movement(Vec):
-    pass
+    __slots__ = ()
 
 
 class Pos(Vec):
-    pass
+    __slots__ = ()
 
 
 @component
 class Frames:
-    animation: Animation
+    # Id of the clip in the game's AnimationTable
+    clip: int
     blit_by: str
+    phase: float = 0.0
+    # 1 while a reversive clip plays forwards, -1 backwards
+    direction: int = 1
+    animated_once: bool = False
+
+    def reset(self):
+        self.phase = 0.0
+        self.direction = 1
+        self.animated_once = False
 
 
 @component
 class Skeleton:
+    MAX_HP = 50
+
     hp: int
     speed: float
 
@@ -44,33 +59,73 @@ class PlayerData:
 class Sword:
     MAX_DISTANCE = 50
     PIERCING_SPEED = 2.5
-
-    def __init__(self, image: pygame.Surface, pos: Pos):
-        self.image = image.copy()
-        self.original_image = image.copy()
+    DAMAGE = 25
+
+    __slots__ = (
+        "image",
+        "rotations",
+        "pos",
+        "rect",
+        "previous_topleft",
+        "distance",
+        "piercing",
+        "angle",
+        "hits",
+        "piercing_speed",
+    )
+
+    def __init__(
+        self,
+        image: pygame.Surface,
+        pos: Pos,
+        rotations: Optional[RotationCache] = None,
+        piercing_speed: float = PIERCING_SPEED,
+    ):
+        # Never drawn onto, so the asset itself is shared
+        self.image = image
+        self.rotations = rotations or RotationCache(image)
         self.pos = pos
         self.rect = image.get_bounding_rect()
         self.rect.midbottom = pos
+        self.previous_topleft = self.rect.topleft
         self.distance = 0
         self.piercing = False
+        self.piercing_speed = piercing_speed
+        # Degrees towards the mouse, `image` is the rotation for it
         self.angle = 0
+        # Entities already hit by the current thrust
+        self.hits: set[int] = set()
 
 
-@component
-class Tile:
-    image: pygame.Surface
-    pos: tuple
+class Camera:
+    """
+    Viewport in world coordinates that follows the `target` entity.
+    """
 
+    __slots__ = ("rect", "target")
 
-@component
-class CollisionTile:
-    rect: pygame.Rect
+    def __init__(self, size: tuple[int, int], target: int):
+        self.rect = pygame.Rect((0, 0), size)
+        self.target = target
+
+    def follow(self, pos: Pos, bounds: Optional[pygame.Rect] = None):
+        """
+        Centres the view on `pos`, kept inside `bounds` when given. Bounds
+        smaller than the view get centred in it instead.
+        """
+        self.rect.center = pos
+        if bounds is not None:
+            self.rect.clamp_ip(bounds)
+
+    def to_world(self, pos: tuple) -> tuple:
+        return pos[0] + self.rect.x, pos[1] + self.rect.y
 
 
 class SkeletonSpawnerTile:
     SKELETON_GEN_TIME = 8.3
 
+    __slots__ = ("image", "pos")
+
     def __init__(self, image: pygame.Surface, pos: tuple):
         self.image = image
         self.pos = pos
-        self.gen_timer = Time(self.SKELETON_GEN_TIME)
@@ -3,7 +3,7 @@ This file is a part of the 'ecs-pygame' source code.
 The source code is distributed under the MIT license.
 """
 
-from typing import Any, Dict, List, Tuple, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import pygame
 from pygame import Vector2 as Vec
@@ -15,6 +15,36 @@ ColorValue = Union[
     pygame.Color, int, str, Tuple[int, int, int], List[int], RgbaOutput
 ]
 Events = List[pygame.event.Event]
-EventInfo = Dict[str, Any]
 WSurfInfo = List[Union[List[int], int]]
 Assets = Dict[str, Union[pygame.Surface, Any]]
+
+
+class FrameContext:
+    """
+    What processors are given every tick or frame. One is kept and updated
+    in place, rather than building a new one each time.
+    """
+
+    __slots__ = ("screen", "dt", "raw_dt", "alpha", "keys", "mouse_pos")
+
+    def __init__(
+        self,
+        screen: Optional[pygame.Surface] = None,
+        dt: float = 1.0,
+        raw_dt: float = 0.0,
+        alpha: float = 1.0,
+        keys: Any = None,
+        mouse_pos: Tuple[float, float] = (0, 0),
+    ):
+        # None for headless ticks
+        self.screen = screen
+        # Time step in units of 1 / Simulation.MOVEMENT_FPS seconds
+        self.dt = dt
+        # Time step in seconds
+        self.raw_dt = raw_dt
+        # How far the frame is between the previous tick and the latest
+        self.alpha = alpha
+        # Pressed state by key code, like pygame.key.get_pressed()
+        self.keys = keys
+        # In world coordinates
+        self.mouse_pos = mouse_pos
@@ -6,69 +6,203 @@ The source code is distributed under the MIT license.
 import logging
 import math
 import random
+from typing import Optional, Sequence
 
 import esper
 import pygame
 
-from game.components import (CollisionTile, Frames, Movement, PlayerData, Pos,
-                             Rectangle, Skeleton, SkeletonSpawnerTile, Sword,
-                             Tile)
-from game.generics import Assets, EventInfo, Vec
+from game.components import (Camera, Frames, Movement, PlayerData, Pos,
+                             Rectangle, Skeleton, SkeletonSpawnerTile, Sword)
+from game.generics import Assets, FrameContext, Vec
 from game.utils import get_movement
-from game.utils.animation import Animation
-from game.utils.classes import Time
+from game.utils.animation import AnimationTable
+from game.utils.classes import Glow
+from game.utils.events import EventBus
+from game.utils.lighting import LightMap
+from game.utils.maps import StaticTileLayer, TileLayer
+from game.utils.pathfinding import FlowField
+from game.utils.pool import EntityPool
+from game.utils.render_queue import RenderQueue
+from game.utils.scheduler import Scheduler, Timer
+from game.utils.spatial import SpatialHash
+from game.utils.store import MotionStore
 
 logger = logging.getLogger()
 
 
 class EntityProcessor(esper.Processor):
-    def __init__(self, assets: Assets):
+    # Range new skeletons pick their speed from
+    SKELETON_SPEED = (0.1, 0.25)
+
+    def __init__(
+        self,
+        assets: Assets,
+        animations: AnimationTable,
+        scheduler: Scheduler,
+        motion_store: MotionStore = None,
+        max_skeletons: Optional[int] = None,
+        gen_time: float = SkeletonSpawnerTile.SKELETON_GEN_TIME,
+        skeleton_speed: tuple[float, float] = SKELETON_SPEED,
+    ):
         self.assets = assets
+        self.animations = animations
+        self.scheduler = scheduler
+        self.motion_store = motion_store
+        # Seconds between the spawns of each spawner
+        self.gen_time = gen_time
+        # Range new skeletons' speed is picked from
+        self.skeleton_speed = skeleton_speed
         self.skeleton_gen_count = random.randrange(1, 3)
+        # Repeating spawn timer of each spawner
+        self.spawn_timers: dict[int, Timer] = {}
+        # Stretches the time between spawns, while frames run long
+        self.spawn_slowdown = 1.0
+        self.spawned = 0
+        self.killed = 0
+
+        # Shared by every skeleton, computed once per asset
+        self.skeleton_clip = self.animations.register(
+            self.assets["skeleton"][:2], speed=0.03
+        )
+        self.skeleton_bounds = self.assets["skeleton"][0].get_bounding_rect()
+        self.skeleton_pool = EntityPool(
+            self.new_skeleton_components, max_skeletons
+        )
+        # Given to every skeleton when set, only the renderer reads it
+        self.skeleton_glow: Optional[Glow] = None
+
+    def new_skeleton_components(self) -> tuple:
+        components = (
+            Skeleton(Skeleton.MAX_HP, 0),
+            Frames(self.skeleton_clip, blit_by="topleft"),
+            Rectangle(self.skeleton_bounds),
+        )
+        if self.motion_store is None:
+            components += (Pos(), Movement())
+        return components
+
+    def spawn_skeleton(self, pos: tuple) -> Optional[int]:
+        """
+        :return: The new skeleton, or None if the pool ceiling is reached
+        """
+        if self.skeleton_pool.full:
+            return None
+
+        components = self.skeleton_pool.acquire()
+        skeleton, frames, rect, *_ = components
+        frames.reset()
+        rect.update(self.skeleton_bounds)
+        # Placed right away, collisions look skeletons up by their rect
+        setattr(rect, frames.blit_by, pos)
+        skeleton.hp = Skeleton.MAX_HP
+        skeleton.speed = random.uniform(*self.skeleton_speed)
+
+        entity = self.add_skeleton(components, pos)
+        self.spawned += 1
+        return entity
+
+    def add_skeleton(
+        self, components: tuple, pos: tuple, entity: Optional[int] = None
+    ) -> int:
+        """
+        Creates a skeleton from pooled components that are already set up,
+        standing still at `pos`.
+
+        :param entity: Id to create it with, defaults to the next one
+        """
+        skeleton, frames, rect, *motion = components
+        if self.motion_store is None:
+            position, movement = motion
+            position.update(pos)
+            movement.update(0, 0)
+        entity = self.world.create_entity(*components, entity=entity)
+        if self.motion_store is not None:
+            self.motion_store.add(
+                self.world,
+                entity,
+                pos,
+                speed=skeleton.speed,
+                offset=(rect.width / 2, rect.height / 2),
+            )
+        if self.skeleton_glow is not None:
+            self.world.add_component(entity, self.skeleton_glow)
+        self.skeleton_pool.add(entity, components)
+        return entity
+
+    def kill_skeleton(self, entity: int):
+        """
+        Deletes the skeleton right away and returns its components to the
+        pool for the next spawn.
+        """
+        if self.motion_store is not None:
+            self.motion_store.remove(entity)
+        self.skeleton_pool.release(entity)
+        self.world.delete_entity(entity, immediate=True)
+        self.killed += 1
+
+    def spawn_skeletons(self, tile: SkeletonSpawnerTile):
+        for _ in range(self.skeleton_gen_count):
+            self.spawn_skeleton(tile.pos)
+            self.skeleton_gen_count = random.randrange(1, 3)
+
+    def schedule_spawners(self):
+        """
+        Starts a spawn timer for every new spawner in the world, and
+        cancels the timers of those that are gone.
+        """
+        spawners = self.world.query(SkeletonSpawnerTile).rows
+        for entity in self.spawn_timers.keys() - spawners.keys():
+            self.scheduler.cancel(self.spawn_timers.pop(entity))
+        for entity, (tile,) in spawners.items():
+            if entity not in self.spawn_timers:
+                self.spawn_timers[entity] = self.scheduler.call_every(
+                    self.gen_time * self.spawn_slowdown,
+                    self.spawn_skeletons,
+                    tile,
+                )
 
-    def spawn_skeletons(self, event_info: EventInfo):
-        for entity, (tile, *_) in self.world.get_components(
-            SkeletonSpawnerTile
-        ):
-            if tile.gen_timer.update():
-                for _ in range(self.skeleton_gen_count):
-                    frames_component = Frames(
-                        Animation(self.assets["skeleton"][:2], speed=0.03),
-                        blit_by="topleft",
-                    )
-                    skeleton_rect = Rectangle(
-                        self.assets["skeleton"][0].get_bounding_rect()
-                    )
-                    skeleton = Skeleton(50, random.uniform(0.1, 0.25))
-                    self.world.create_entity(
-                        skeleton,
-                        frames_component,
-                        Pos(tile.pos),
-                        skeleton_rect,
-                        Movement(0, 0),
-                    )
-                    self.skeleton_gen_count = random.randrange(1, 3)
+    def set_spawn_slowdown(self, slowdown: float):
+        """
+        Multiplies the time between spawns by `slowdown`, from the next
+        spawn of each spawner on.
+        """
+        self.spawn_slowdown = slowdown
+        for timer in self.spawn_timers.values():
+            timer.interval = self.gen_time * slowdown
 
-    def process(self, event_info: EventInfo):
-        self.spawn_skeletons(event_info)
+    def process(self, context: FrameContext):
+        spawners = self.world.query(SkeletonSpawnerTile)
+        # The spawns themselves come from the scheduler
+        if len(spawners) != len(self.spawn_timers):
+            self.schedule_spawners()
+        self.entity_count = len(spawners)
 
 
 class InputProcessor(esper.Processor):
     SMOOTH_DIAGONAL = math.sqrt(2) / 2
 
-    def __init__(self):
+    def __init__(
+        self,
+        events: EventBus,
+        motion_store: MotionStore = None,
+        skeleton_size: tuple[int, int] = (1, 1),
+    ):
+        self.clicks = events.subscribe(pygame.MOUSEBUTTONDOWN)
+        self.motion_store = motion_store
+        self.skeleton_size = skeleton_size
         self.player_pos = (70, 50)
+        self.flow_field = None
 
-    def player_input_handler(self, clicked, event_info):
-        dt = event_info["dt"]
-        keys = event_info["keys"]
-        mouse_pos = event_info["mouse pos"]
+    def player_input_handler(self, clicked: bool, context: FrameContext):
+        dt = context.dt
+        keys = context.keys
+        mouse_pos = context.mouse_pos
         for entity, (
             pos,
             movement,
             player_data,
             sword,
-        ) in self.world.get_components(Pos, Movement, PlayerData, Sword):
+        ) in self.world.query(Pos, Movement, PlayerData, Sword):
             self.player_pos = pos
             movement.x, movement.y = 0, 0
             if keys[pygame.K_w]:
@@ -84,8 +218,10 @@ class InputProcessor(esper.Processor):
                 movement.x *= self.SMOOTH_DIAGONAL
                 movement.y *= self.SMOOTH_DIAGONAL
 
-            if clicked:
+            # Clicks during a thrust don't restart it, nor its hits
+            if clicked and not sword.piercing:
                 sword.piercing = True
+                sword.hits.clear()
 
             if not sword.piercing:
                 sword.pos = pos.copy()
@@ -96,11 +232,14 @@ class InputProcessor(esper.Processor):
                     mouse_pos[0] - sword.pos.x,
                 )
             )
-            sword.image = pygame.transform.rotate(sword.original_image, -angle)
+            sword.angle = angle
+            sword.image = sword.rotations.get(-angle)
 
             if sword.piercing:
                 if sword.distance < sword.MAX_DISTANCE:
-                    dx, dy = get_movement(angle, sword.PIERCING_SPEED)
+                    dx, dy = get_movement(
+                        math.radians(angle), sword.piercing_speed
+                    )
                     sword.pos.x += dx * dt
                     sword.pos.y += dy * dt
 
@@ -111,70 +250,524 @@ class InputProcessor(esper.Processor):
                     sword.piercing = False
                     sword.distance = 0
 
+            sword.previous_topleft = sword.rect.topleft
             sword.rect.midbottom = sword.pos
 
+    def build_flow_field(self) -> Optional[FlowField]:
+        """
+        Makes the flow field over the world's tile layer, if it has no
+        field over it yet. Call it once the level is loaded, building a
+        field over a large map takes a while.
+        """
+        for entity, (tile_layer,) in self.world.query(TileLayer):
+            if (
+                self.flow_field is None
+                or self.flow_field.tile_layer is not tile_layer
+            ):
+                self.flow_field = FlowField(tile_layer, self.skeleton_size)
+            return self.flow_field
+
+        self.flow_field = None
+        return None
+
+    def update_flow_field(self) -> Optional[FlowField]:
+        flow_field = self.build_flow_field()
+        if flow_field is not None:
+            flow_field.update(self.player_pos)
+        return flow_field
+
     def skeleton_input_handler(self, dt):
-        for entity, (skeleton, movement, pos) in self.world.get_components(
-            Skeleton, Movement, Pos
-        ):
-            angle = math.atan2(self.player_pos.y - pos.y, self.player_pos.x - pos.x)
-            movement.x, movement.y = get_movement(angle, skeleton.speed * dt)
+        flow_field = self.update_flow_field()
+        if self.motion_store is not None:
+            self.motion_store.chase(self.player_pos, dt, flow_field)
 
-    def process(self, event_info: EventInfo):
-        dt = event_info["dt"]
-        keys = event_info["keys"]
-        mouse_pos = event_info["mouse pos"]
+        for entity, (
+            skeleton,
+            movement,
+            pos,
+            rect,
+        ) in self.world.query(Skeleton, Movement, Pos, Rectangle):
+            if self.motion_store is not None and entity in self.motion_store:
+                continue
+
+            waypoint = flow_field and flow_field.waypoint(rect.center)
+            if waypoint:
+                angle = math.atan2(
+                    waypoint[1] - rect.centery, waypoint[0] - rect.centerx
+                )
+            else:
+                angle = math.atan2(
+                    self.player_pos.y - pos.y, self.player_pos.x - pos.x
+                )
+            movement.x, movement.y = get_movement(angle, skeleton.speed * dt)
 
-        clicked = False
-        for event in event_info["events"]:
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                clicked = True
+    def process(self, context: FrameContext):
+        clicked = bool(self.clicks)
+        self.clicks.clear()
 
-        self.player_input_handler(clicked, event_info)
-        self.skeleton_input_handler(dt)
+        self.player_input_handler(clicked, context)
+        self.skeleton_input_handler(context.dt)
+        self.entity_count = len(
+            self.world.query(Skeleton, Movement, Pos, Rectangle)
+        )
 
 
 class CollisionProcessor(esper.Processor):
-    def tile_collision_handler(self):
-        for entity, (pos, movement, rect, frames) in self.world.get_components(
-            Pos, Movement, Rectangle, Frames
-        ):
-            for tile_entity, (tile, *_) in self.world.get_components(
-                CollisionTile
+    # How fast overlapping skeletons push each other apart
+    SEPARATION_SPEED = 0.3
+
+    def __init__(
+        self,
+        entity_processor: EntityProcessor,
+        cell_size: int = SpatialHash.CELL_SIZE,
+    ):
+        self.entity_processor = entity_processor
+        # Skeletons by the centre of their rect, cells fit a whole skeleton
+        self.skeleton_index = SpatialHash(cell_size)
+        self.counters = {"pairs": 0, "contacts": 0, "hits": 0}
+
+    def update_skeleton_index(self) -> dict[int, tuple]:
+        skeletons = self.world.query(Skeleton, Rectangle)
+        index = self.skeleton_index
+        cell_size = index.cell_size
+        cells = index.entities
+        for entity, (skeleton, rect) in skeletons:
+            x, y = rect.center
+            # Most skeletons stay in their cell from one tick to the next
+            if cells.get(entity) != (x // cell_size, y // cell_size):
+                index.move(entity, x, y)
+        for entity in index.entities.keys() - skeletons.rows.keys():
+            index.remove(entity)
+        return skeletons.rows
+
+    def separation_handler(self, skeletons: dict[int, tuple], dt: float):
+        """
+        Pushes overlapping skeletons apart, along the line between their
+        centres. The pushes on a skeleton are summed exactly, so the result
+        doesn't depend on the order the index yields pairs in, which
+        changes after a snapshot is restored.
+        """
+        movements = self.world.query(Skeleton, Movement).rows
+        push = self.SEPARATION_SPEED * dt / 2
+        pushes: dict[int, list[tuple[float, float]]] = {}
+        pairs = contacts = 0
+        for entity, other in self.skeleton_index.pairs():
+            pairs += 1
+            rect = skeletons[entity][1]
+            other_rect = skeletons[other][1]
+            if not rect.colliderect(other_rect):
+                continue
+            contacts += 1
+            if other < entity:
+                entity, other = other, entity
+                rect, other_rect = other_rect, rect
+
+            dx = other_rect.centerx - rect.centerx
+            dy = other_rect.centery - rect.centery
+            distance = math.hypot(dx, dy)
+            if distance:
+                dx, dy = dx / distance * push, dy / distance * push
+            else:
+                # Stacked exactly, split them sideways
+                dx, dy = push, 0
+            pushes.setdefault(entity, []).append((-dx, -dy))
+            pushes.setdefault(other, []).append((dx, dy))
+
+        for entity, entity_pushes in pushes.items():
+            movement = movements[entity][1]
+            movement.x = math.fsum(
+                (movement.x, *(x for x, _ in entity_pushes))
+            )
+            movement.y = math.fsum(
+                (movement.y, *(y for _, y in entity_pushes))
+            )
+
+        self.counters["pairs"] = pairs
+        self.counters["contacts"] = contacts
+
+    def sword_hit_handler(self, skeletons: dict[int, tuple]) -> list[int]:
+        """
+        Damages the skeletons a thrusting sword touches, once per thrust.
+
+        :return: Skeletons that died
+        """
+        killed = []
+        hits = 0
+        for entity, (sword,) in self.world.query(Sword):
+            if not sword.piercing:
+                continue
+
+            blade = pygame.Rect(sword.rect.topleft, sword.image.get_size())
+            reach = self.skeleton_index.cell_size * 2
+            for target in self.skeleton_index.query(
+                blade.inflate(reach, reach)
+            ):
+                skeleton, rect = skeletons[target]
+                if target in sword.hits or not blade.colliderect(rect):
+                    continue
+                sword.hits.add(target)
+                hits += 1
+                skeleton.hp -= sword.DAMAGE
+                if skeleton.hp <= 0:
+                    killed.append(target)
+
+        self.counters["hits"] = hits
+        return killed
+
+    def tile_collision_handler(self, tile_layer: TileLayer):
+        rows = self.world.query(Pos, Movement, Rectangle, Frames).rows
+        entities = rows.keys()
+        motion_store = self.entity_processor.motion_store
+        if motion_store is not None:
+            entities = rows.keys() - motion_store.index.keys()
+            # Store entities are skeletons, which all have a rect
+            stored = [rows[entity] for entity in motion_store.entities]
+            moved = motion_store.stop_at_tiles(
+                tile_layer, [rect for _, _, rect, _ in stored]
+            )
+            for (_, _, rect, frames), topleft in zip(stored, moved):
+                setattr(rect, frames.blit_by, topleft)
+
+        for entity in entities:
+            pos, movement, rect, frames = rows[entity]
+            if tile_layer.collides(
+                pygame.Rect(rect.x + movement.x, rect.y, *rect.size)
+            ):
+                movement.x = 0
+            if tile_layer.collides(
+                pygame.Rect(rect.x, rect.y + movement.y, *rect.size)
             ):
-                if tile.rect.colliderect(
-                    pygame.Rect(rect.x + movement.x, rect.y, *rect.size)
-                ):
-                    movement.x = 0
-                if tile.rect.colliderect(
-                    pygame.Rect(rect.x, rect.y + movement.y, *rect.size)
-                ):
-                    movement.y = 0
+                movement.y = 0
 
             setattr(rect, frames.blit_by, pos + movement)
 
-    def process(self, event_info: EventInfo):
-        self.tile_collision_handler()
+    def process(self, context: FrameContext):
+        skeletons = self.update_skeleton_index()
+        self.separation_handler(skeletons, context.dt)
+        for entity in self.sword_hit_handler(skeletons):
+            self.entity_processor.kill_skeleton(entity)
+            self.skeleton_index.remove(entity)
+
+        # Last, so that no push moves anything into a wall
+        for entity, (tile_layer,) in self.world.query(TileLayer):
+            self.tile_collision_handler(tile_layer)
+        self.entity_count = len(
+            self.world.query(Pos, Movement, Rectangle, Frames)
+        )
 
 
 class MovementProcessor(esper.Processor):
-    def process(self, event_info: EventInfo):
-        for entity, (pos, movement) in self.world.get_components(
-            Pos, Movement
-        ):
+    def __init__(
+        self,
+        motion_store: MotionStore = None,
+        spatial_index: Optional[SpatialHash] = None,
+    ):
+        self.motion_store = motion_store
+        # Kept up to date with the positions of all entities that have one
+        self.spatial_index = spatial_index
+        # Positions before the latest tick, for render interpolation
+        self.previous: dict[int, tuple[float, float]] = {}
+        # Store positions blended for the frame at `interpolated_alpha`
+        self.interpolated: list[list[float]] = []
+        self.interpolated_alpha: Optional[float] = None
+
+    def interpolate(
+        self, entity: int, pos: Vec, alpha: float
+    ) -> Sequence[float]:
+        """
+        :param alpha: How far the frame is between the previous tick (0)
+        and the latest one (1)
+        :return: Position to draw the entity at
+        """
+        if self.motion_store is not None:
+            row = self.motion_store.index.get(entity)
+            if row is not None:
+                # The whole store is blended at once, first thing per frame
+                if self.interpolated_alpha != alpha:
+                    self.interpolated = self.motion_store.interpolate(alpha)
+                    self.interpolated_alpha = alpha
+                return self.interpolated[row]
+
+        prev = self.previous.get(entity)
+        if prev is None:
+            return pos
+        return Vec(
+            prev[0] + (pos[0] - prev[0]) * alpha,
+            prev[1] + (pos[1] - prev[1]) * alpha,
+        )
+
+    def reset_history(self):
+        """
+        Forgets where entities were before the latest tick and which cells
+        they were indexed in, for when they were moved outside of `process`.
+        """
+        self.previous.clear()
+        self.interpolated_alpha = None
+        if self.motion_store is not None:
+            n = len(self.motion_store)
+            self.motion_store.prev[:n] = self.motion_store.pos[:n]
+            self.motion_store.unindex()
+
+    def process(self, context: FrameContext):
+        motion_store = self.motion_store
+        spatial_index = self.spatial_index
+        movers = self.world.query(Pos, Movement)
+        rows = movers.rows
+        if motion_store is None:
+            entities = rows.keys()
+        else:
+            motion_store.integrate()
+            self.interpolated_alpha = None
+            entities = rows.keys() - motion_store.index.keys()
+
+        previous = {}
+        for entity in entities:
+            pos, movement = rows[entity]
+            previous[entity] = pos.x, pos.y
             pos += movement
+            if spatial_index is not None:
+                spatial_index.move(entity, pos.x, pos.y)
+        self.previous = previous
+
+        if spatial_index is not None:
+            if motion_store is not None:
+                # Only the few rows that changed cell go through the index
+                pos = motion_store.pos
+                store_entities = motion_store.entities
+                for row in motion_store.moved_rows(spatial_index.cell_size):
+                    x, y = pos[row].tolist()
+                    spatial_index.move(store_entities[row], x, y)
+            self.index_still(rows)
+        self.entity_count = len(movers)
+
+    def index_still(self, movers: dict[int, tuple]):
+        """
+        Indexes the positioned entities that don't move, in case their
+        position was set since, and drops deleted entities from the index.
+
+        :param movers: Rows of the entities with a `Movement`
+        """
+        spatial_index = self.spatial_index
+        positioned = self.world.query(Pos).rows
+        for entity in positioned.keys() - movers.keys():
+            (pos,) = positioned[entity]
+            spatial_index.move(entity, pos.x, pos.y)
+        for entity in spatial_index.entities.keys() - positioned.keys():
+            spatial_index.remove(entity)
 
 
 class RenderProcessor(esper.Processor):
-    def process(self, event_info: EventInfo):
-        screen = event_info["screen"]
-        dt = event_info["dt"]
-        for entity, (tile, *_) in self.world.get_components(Tile):
-            screen.blit(tile.image, tile.pos)
-
-        for entity, (frames, pos) in self.world.get_components(Frames, Pos):
-            frames.animation.update(dt)
-            frames.animation.draw(screen, pos, blit_by=frames.blit_by)
-
-        for entity, (sword, *_) in self.world.get_components(Sword):
-            screen.blit(sword.image, sword.rect)
+    BACKGROUND = (25, 25, 25)
+    # Above this fraction of the screen, a full flip beats dirty rects
+    DIRTY_AREA_LIMIT = 0.5
+    # How far sprites can reach past their position, for culling
+    CULL_MARGIN = 48
+    # Fraction of the view around its middle where animations never skip
+    NEAR_AREA = 0.5
+    # Render queue layers, sprites within one are sorted by their feet
+    SPRITE_LAYER = 0
+    SWORD_LAYER = 1
+
+    def __init__(
+        self,
+        movement_processor: MovementProcessor,
+        animations: AnimationTable,
+        spatial_index: SpatialHash,
+        dirty_rects: bool = False,
+    ):
+        self.movement_processor = movement_processor
+        self.animations = animations
+        # Holds every positioned entity, see MovementProcessor
+        self.spatial_index = spatial_index
+        self.dirty_rects = dirty_rects
+        self.view = pygame.Rect(0, 0, 0, 0)
+        # Screen regions to update, None means the whole screen
+        self.dirty: Optional[list[pygame.Rect]] = None
+        self.drawn: list[pygame.Rect] = []
+        self.redraw = True
+        # Frames between animation steps away from the middle of the view
+        self.distant_stride = 1
+        self.frame = 0
+        self.queue = RenderQueue()
+
+    def invalidate(self):
+        """
+        Updates the whole screen this frame and redraws all of it on the
+        next one, for when something else was drawn on top.
+        """
+        self.dirty = None
+        self.redraw = True
+
+    def draw_background(
+        self, screen: pygame.Surface, area: Optional[pygame.Rect] = None
+    ):
+        screen.fill(self.BACKGROUND, area)
+        for entity, (tile_layer,) in self.world.query(StaticTileLayer):
+            if area is None:
+                tile_layer.draw(screen, self.view)
+            else:
+                tile_layer.draw_area(screen, area, self.view)
+
+    def update_view(self, screen: pygame.Surface, alpha: float):
+        """
+        Moves every camera to its target's interpolated position and uses
+        the first one as the view, or the screen if there is none.
+        """
+        bounds = None
+        for entity, (tile_layer,) in self.world.query(TileLayer):
+            bounds = tile_layer.rect
+
+        view = None
+        for entity, (camera,) in self.world.query(Camera):
+            pos = self.world.component_for_entity(camera.target, Pos)
+            camera.follow(
+                self.movement_processor.interpolate(camera.target, pos, alpha),
+                bounds,
+            )
+            if view is None:
+                view = camera.rect
+        self.view = (view or screen.get_rect()).copy()
+
+    def animate(self, visible: list[int], animated: list[tuple], dt: float):
+        """
+        Steps the animations of the visible entities. Those away from the
+        middle of the view only step every `distant_stride` frames, by
+        that many frames' worth of time.
+        """
+        self.frame += 1
+        stride = self.distant_stride
+        if stride == 1:
+            self.animations.step((frames for frames, _ in animated), dt)
+            return
+
+        view = self.view
+        near = set(
+            self.spatial_index.query(
+                view.inflate(
+                    -view.width * (1 - self.NEAR_AREA),
+                    -view.height * (1 - self.NEAR_AREA),
+                )
+            )
+        )
+        rows = list(zip(visible, animated))
+        self.animations.step(
+            (frames for entity, (frames, _) in rows if entity in near), dt
+        )
+        if self.frame % stride == 0:
+            self.animations.step(
+                (frames for entity, (frames, _) in rows if entity not in near),
+                dt * stride,
+            )
+
+    def process(self, context: FrameContext):
+        screen = context.screen
+        dt = context.dt
+        alpha = context.alpha
+        interpolate = self.movement_processor.interpolate
+
+        previous_view = self.view
+        self.update_view(screen, alpha)
+        view_x, view_y = self.view.topleft
+        full_redraw = (
+            not self.dirty_rects
+            or self.redraw
+            or self.view != previous_view
+            or any(
+                tile_layer.dirty
+                for entity, (tile_layer,) in self.world.query(StaticTileLayer)
+            )
+        )
+        if full_redraw:
+            self.draw_background(screen)
+        else:
+            for rect in self.drawn:
+                self.draw_background(screen, rect)
+
+        rows = self.world.query(Frames, Pos).rows
+        spatial_index = self.spatial_index
+        # Created since the last tick, so not indexed yet
+        for entity in rows.keys() - spatial_index.entities.keys():
+            pos = rows[entity][1]
+            spatial_index.move(entity, pos.x, pos.y)
+        visible = sorted(
+            entity
+            for entity in spatial_index.query(
+                self.view.inflate(self.CULL_MARGIN * 2, self.CULL_MARGIN * 2)
+            )
+            if entity in rows
+        )
+        animated = [rows[entity] for entity in visible]
+        self.animate(visible, animated, dt)
+
+        queue = self.queue
+        sprites = queue.layer(self.SPRITE_LAYER).append
+        clips = self.animations.clips
+        for entity, (frames, pos) in zip(visible, animated):
+            clip = clips[frames.clip]
+            index = int(frames.phase)
+            offset_x, offset_y = clip.offsets(frames.blit_by)[index]
+            x, y = interpolate(entity, pos, alpha)
+            # Round half away from zero, like pygame.Rect does
+            left = offset_x - view_x + int(x + (0.5 if x >= 0 else -0.5))
+            top = offset_y - view_y + int(y + (0.5 if y >= 0 else -0.5))
+            sprites(
+                (top + clip.bottoms[index], (clip.frames[index], (left, top)))
+            )
+        self.entity_count = len(visible)
+
+        for entity, (sword, *_) in self.world.query(Sword):
+            topleft = Vec(sword.previous_topleft).lerp(
+                sword.rect.topleft, alpha
+            ) - (view_x, view_y)
+            queue.submit(sword.image, topleft, self.SWORD_LAYER, topleft.y)
+
+        drawn = queue.flush(screen, return_rects=self.dirty_rects)
+
+        self.dirty = None
+        if not full_redraw:
+            dirty = self.drawn + drawn
+            area = sum(rect.width * rect.height for rect in dirty)
+            if area <= screen.get_width() * screen.get_height() * (
+                self.DIRTY_AREA_LIMIT
+            ):
+                self.dirty = dirty
+        self.drawn = drawn
+        self.redraw = False
+
+
+class LightingProcessor(esper.Processor):
+    """
+    Adds the light of every `Glow` on screen through one `LightMap`, over
+    what the `RenderProcessor` drew.
+    """
+
+    def __init__(
+        self,
+        movement_processor: MovementProcessor,
+        render_processor: RenderProcessor,
+        light_map: LightMap,
+    ):
+        self.movement_processor = movement_processor
+        self.render_processor = render_processor
+        self.light_map = light_map
+
+    def process(self, context: FrameContext):
+        view = self.render_processor.view
+        interpolate = self.movement_processor.interpolate
+        alpha = context.alpha
+        lights = []
+        for entity, (glow, pos) in self.world.query(Glow, Pos):
+            x, y = interpolate(entity, pos, alpha)
+            x += glow.offset[0] - view.x
+            y += glow.offset[1] - view.y
+            radius = glow.radius
+            if (
+                -radius < x < view.width + radius
+                and -radius < y < view.height + radius
+            ):
+                lights.append((x, y, radius, glow.color))
+
+        self.entity_count = self.light_map.draw(context.screen, lights)
+        if self.entity_count:
+            # The light spreads over sprites that dirty rects don't track
+            self.render_processor.invalidate()
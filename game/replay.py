@@ -0,0 +1,110 @@
+"""
+This file is a part of the 'ecs-pygame' source code.
+The source code is distributed under the MIT license.
+
+Replays a session recorded with `python -m game --record FILE` headless
+and as fast as possible, then checks that it ended in the recorded
+state. Useful as a repeatable load test.
+
+    python -m game.replay session.rec --repeat 5 --output replay.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import time
+from collections import defaultdict
+from typing import Optional
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from game.enums import GameStates
+from game.generics import Assets
+from game.sim import Simulation
+from game.utils.recording import RECORDED_KEYS, Recording, read_recording
+from game.utils.sprites import load_assets
+
+logger = logging.getLogger()
+
+
+def replay(recording: Recording, assets: Assets) -> dict:
+    """
+    Feeds the recorded inputs to a fresh headless simulation.
+
+    :return: Timings and whether the final state matched the recording
+    """
+    random.seed(recording.seed)
+    simulation = Simulation(
+        assets,
+        recording.level_map,
+        recording.max_skeletons,
+        recording.array_store,
+        recording.tick_rate,
+    )
+
+    entity_processor = simulation.entity_processor
+    keys = defaultdict(bool)
+    start = time.perf_counter()
+    for raw_dt, key_mask, mouse_pos, clicks, slowdown in recording.frames:
+        if slowdown != entity_processor.spawn_slowdown:
+            entity_processor.set_spawn_slowdown(slowdown)
+        for bit, key in enumerate(RECORDED_KEYS):
+            keys[key] = bool(key_mask & (1 << bit))
+        simulation.events.dispatch(
+            pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=mouse_pos, button=1)
+            for _ in range(clicks)
+        )
+        simulation.advance(raw_dt, keys, mouse_pos)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "frames": len(recording.frames),
+        "ticks": simulation.ticks,
+        "total_s": elapsed,
+        "ticks_per_s": simulation.ticks / elapsed if elapsed else None,
+        "matches": (
+            None
+            if recording.digest is None
+            else simulation.digest() == recording.digest
+        ),
+    }
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m game.replay", description=__doc__.split("\n\n")[1]
+    )
+    parser.add_argument("recording")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON here, not stdout")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig()
+    logger.setLevel("WARNING")
+    recording = read_recording(args.recording)
+    assets = load_assets(GameStates.LEVEL.value)
+    runs = [replay(recording, assets) for _ in range(args.repeat)]
+    results = {
+        "recording": args.recording,
+        "runs": runs,
+        "mean_s": statistics.fmean(run["total_s"] for run in runs),
+    }
+
+    report = json.dumps(results, indent=4)
+    if args.output is None:
+        print(report)
+    else:
+        with open(args.output, "w") as f:
+            f.write(report)
+    if any(run["matches"] is False for run in runs):
+        raise SystemExit("Replay diverged from the recording")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+This file is a part of the 'ecs-pygame' source code.
+The source code is distributed under the MIT license.
+"""
+
+import hashlib
+import struct
+from typing import Optional
+
+from game.components import (Camera, Frames, Movement, PlayerData, Pos,
+                             Rectangle, Skeleton, SkeletonSpawnerTile, Sword)
+from game.generics import Assets, FrameContext
+from game.processors import (CollisionProcessor, EntityProcessor,
+                             InputProcessor, MovementProcessor)
+from game.utils.animation import AnimationTable
+from game.utils.events import EventBus
+from game.utils.maps import load_map
+from game.utils.scheduler import Scheduler
+from game.utils.snapshot import restore_snapshot, take_snapshot
+from game.utils.spatial import SpatialHash
+from game.utils.store import MotionStore
+from game.utils.world import World
+
+
+class Simulation:
+    """
+    A level's world with the player and the simulation processors, and
+    no display. `Game` renders one, headless runs step it directly.
+    """
+
+    TILE_SIZE = 16
+    PLAYER_START = (70, 50)
+    VIEW_SIZE = (416, 336)
+    # Simulation ticks per second, independent of the render rate
+    TICK_RATE = 60
+    # Movement is tuned in units of 1 / MOVEMENT_FPS seconds
+    MOVEMENT_FPS = 120
+    # Most ticks run in one `advance` before the simulation falls behind
+    MAX_CATCH_UP = 5
+
+    def __init__(
+        self,
+        assets: Assets,
+        level_map: list[str],
+        max_skeletons: Optional[int] = None,
+        array_store: bool = False,
+        tick_rate: int = TICK_RATE,
+        view_size: tuple[int, int] = VIEW_SIZE,
+        gen_time: float = SkeletonSpawnerTile.SKELETON_GEN_TIME,
+        skeleton_speed: tuple[float, float] = EntityProcessor.SKELETON_SPEED,
+        piercing_speed: float = Sword.PIERCING_SPEED,
+    ):
+        self.assets = assets
+        self.tick_time = 1 / tick_rate
+        self.tick_dt = self.MOVEMENT_FPS / tick_rate
+        self.accumulator = 0.0
+        self.ticks = 0
+        # Timers follow the simulated ticks, so that runs can be replayed
+        self.scheduler = Scheduler()
+
+        # Events wait in their subscribers' queues until a tick reads them
+        self.events = EventBus()
+        self.context = FrameContext(dt=self.tick_dt, raw_dt=self.tick_time)
+        self.world = World()
+        load_map(self.world, level_map, assets["tile_set"], self.TILE_SIZE)
+
+        self.animations = AnimationTable()
+        self.player = self.world.create_entity(
+            Pos(self.PLAYER_START),
+            Movement(),
+            Rectangle(self.PLAYER_START, assets["player"][0].get_size()),
+            PlayerData(speed=0.7),
+            Frames(
+                self.animations.register(assets["player"], 0.05),
+                blit_by="midbottom",
+            ),
+            Sword(
+                image=assets["sword"],
+                pos=Pos(self.PLAYER_START),
+                piercing_speed=piercing_speed,
+            ),
+        )
+        # Made headless too, entity ids have to match the rendered game's
+        self.camera = Camera(view_size, target=self.player)
+        self.world.create_entity(self.camera)
+
+        self.motion_store = (
+            MotionStore()
+            if array_store and MotionStore.is_available()
+            else None
+        )
+        self.entity_processor = EntityProcessor(
+            assets,
+            self.animations,
+            self.scheduler,
+            self.motion_store,
+            max_skeletons,
+            gen_time,
+            skeleton_speed,
+        )
+        skeleton_size = assets["skeleton"][0].get_bounding_rect().size
+        self.input_processor = InputProcessor(
+            self.events, self.motion_store, skeleton_size
+        )
+        self.spatial_index = SpatialHash()
+        self.movement_processor = MovementProcessor(
+            self.motion_store, self.spatial_index
+        )
+        self.collision_processor = CollisionProcessor(
+            self.entity_processor, cell_size=max(skeleton_size)
+        )
+        self.world.add_processor(self.entity_processor, priority=4)
+        self.world.add_processor(self.input_processor, priority=3)
+        self.world.add_processor(self.collision_processor, priority=2)
+        self.world.add_processor(self.movement_processor, priority=1)
+        self.entity_processor.schedule_spawners()
+        self.input_processor.build_flow_field()
+
+    @property
+    def processors(self) -> tuple:
+        return (
+            self.entity_processor,
+            self.input_processor,
+            self.collision_processor,
+            self.movement_processor,
+        )
+
+    @property
+    def alpha(self) -> float:
+        """
+        How far the present is between the previous tick (0) and the
+        latest one (1).
+        """
+        return self.accumulator / self.tick_time
+
+    def step(self, keys, mouse_pos: tuple):
+        """
+        Runs one simulation tick, with the events dispatched to `events`
+        since the last one.
+        """
+        context = self.context
+        context.keys = keys
+        context.mouse_pos = mouse_pos
+        self.world.process(context)
+        self.scheduler.advance(self.tick_time)
+        self.ticks += 1
+
+    def advance(self, raw_dt: float, keys, mouse_pos: tuple) -> int:
+        """
+        Runs as many fixed ticks as `raw_dt` seconds add up to.
+
+        :return: The number of ticks run
+        """
+        self.accumulator = min(
+            self.accumulator + raw_dt, self.tick_time * self.MAX_CATCH_UP
+        )
+
+        ticks = 0
+        while self.accumulator >= self.tick_time:
+            self.step(keys, mouse_pos)
+            self.accumulator -= self.tick_time
+            ticks += 1
+        return ticks
+
+    def snapshot(self) -> bytes:
+        """
+        :return: The gameplay state, for `restore` to go back to
+        """
+        return take_snapshot(self)
+
+    def restore(self, snapshot: bytes) -> int:
+        """
+        Rolls the simulation back, or forwards, to a snapshot. Only the
+        entities that differ from it are written.
+
+        :return: How many entities were written
+        """
+        return restore_snapshot(self, snapshot)
+
+    def digest(self) -> bytes:
+        """
+        :return: Hash of every position, movement and skeleton's hp, to
+        check that two runs ended in the same state
+        """
+        digest = hashlib.sha1()
+        for entity, (pos, movement) in sorted(
+            self.world.query(Pos, Movement), key=lambda row: row[0]
+        ):
+            digest.update(struct.pack("<I4d", entity, pos.x, pos.y, *movement))
+        for entity, (skeleton,) in sorted(
+            self.world.query(Skeleton), key=lambda row: row[0]
+        ):
+            digest.update(struct.pack("<Id", entity, skeleton.hp))
+        return digest.digest()
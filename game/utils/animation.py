@@ -3,7 +3,8 @@ This file is a part of the 'ecs-pygame' source code.
 The source code is distributed under the MIT license.
 """
 
-from typing import Sequence
+import math
+from typing import Iterable, Protocol, Sequence
 
 import pygame
 
@@ -51,7 +52,9 @@ class Animation:
 
         self._check_size()
 
-    def draw(self, screen: pygame.Surface, pos: Pos, blit_by: str = "topleft"):
+    def draw(
+        self, screen: pygame.Surface, pos: Pos, blit_by: str = "topleft"
+    ) -> pygame.Rect:
         frame = self.frames[int(self.index)]
 
         if blit_by:
@@ -59,8 +62,112 @@ class Animation:
             setattr(frame_rect, blit_by, tuple(pos))
             pos = frame_rect.topleft
 
-        screen.blit(frame, pos)
+        return screen.blit(frame, pos)
 
     def play(self, screen, pos, dt, blit_by: str = "topleft"):
         self.update(dt)
         self.draw(screen, pos, blit_by)
+
+
+class AnimationState(Protocol):
+    clip: int
+    phase: float
+    direction: int
+    animated_once: bool
+
+
+class Clip:
+    """
+    Frames of an animation shared by every entity playing it, with the
+    blit offset of each frame from each anchor computed once.
+    """
+
+    def __init__(
+        self,
+        frames: Sequence[pygame.Surface],
+        speed: float,
+        reversive: bool = False,
+    ):
+        self.frames = tuple(frames)
+        self.speed = speed
+        self.reversive = reversive
+        self.f_len = len(self.frames)
+        # Largest phase that still maps to the last frame
+        self.end = math.nextafter(self.f_len, 0)
+        # Per frame, how far below its top the visible pixels end
+        self.bottoms = tuple(
+            frame.get_bounding_rect().bottom for frame in self.frames
+        )
+        self.anchor_offsets: dict[str, tuple[tuple[int, int], ...]] = {}
+
+    def offsets(self, anchor: str) -> tuple[tuple[int, int], ...]:
+        """
+        :return: Per frame, the topleft of the frame when `anchor` is at
+        (0, 0)
+        """
+        offsets = self.anchor_offsets.get(anchor)
+        if offsets is None:
+            offsets = []
+            for frame in self.frames:
+                frame_rect = frame.get_rect()
+                setattr(frame_rect, anchor, (0, 0))
+                offsets.append(frame_rect.topleft)
+            offsets = self.anchor_offsets[anchor] = tuple(offsets)
+        return offsets
+
+
+class AnimationTable:
+    """
+    Registry of the clips entities can play. Entities only keep a clip id
+    and a phase, which `step` advances.
+    """
+
+    def __init__(self):
+        self.clips: list[Clip] = []
+        self.ids: dict[tuple, int] = {}
+
+    def register(
+        self,
+        frames: Sequence[pygame.Surface],
+        speed: float,
+        reversive: bool = False,
+    ) -> int:
+        """
+        :return: Clip id, shared with earlier registrations of the same
+        frames, speed and mode
+        """
+        key = tuple(frames), speed, reversive
+        clip_id = self.ids.get(key)
+        if clip_id is None:
+            clip_id = self.ids[key] = len(self.clips)
+            self.clips.append(Clip(frames, speed, reversive))
+        return clip_id
+
+    def step(self, states: Iterable[AnimationState], dt: float):
+        """
+        Advances the phase of each state by `dt`, one state at a time.
+        Phases live on the components, gathering them into arrays and back
+        would cost more than this loop.
+        """
+        clips = self.clips
+        for state in states:
+            clip = clips[state.clip]
+            if clip.reversive:
+                # Ping-pong between the first and last frame
+                phase = state.phase + state.direction * clip.speed * dt
+                if phase >= clip.f_len:
+                    phase = clip.end
+                    state.direction = -1
+                    state.animated_once = True
+                elif phase <= 0:
+                    phase = 0.0
+                    state.direction = 1
+            else:
+                phase = state.phase + clip.speed * dt
+                if phase >= clip.f_len:
+                    phase = 0.0
+                    state.animated_once = True
+            state.phase = phase
+
+    def frame(self, state: AnimationState) -> pygame.Surface:
+        return self.clips[state.clip].frames[int(state.phase)]
@@ -3,46 +3,22 @@ This file is a part of the 'ecs-pygame' source code.
 The source code is distributed under the MIT license.
 """
 
-import time
-
 import pygame
 
 
 class Glow:
-    def __init__(self, image: pygame.Surface, color, topleft):
-        self.img_rect = image.get_bounding_rect()
-        self.img_rect.topleft = topleft
-        self.surf = circle_surf(self.img_rect.height, color)
-        self.rect = self.surf.get_rect(center=self.img_rect.center)
-
-    def change_pos(self, new_pos):
-        self.rect = pygame.Rect(new_pos, self.rect.size)
-
-    def draw(self, screen: pygame.Surface, camera):
-        screen.blit(
-            self.surf,
-            (
-                self.rect.x - camera[0],
-                self.rect.y - camera[1] + (self.img_rect.height // 2),
-            ),
-            special_flags=pygame.BLEND_RGB_ADD,
-        )
-
-
-class Time:
     """
-    Class to check if time has passed.
+    Light around an entity, added onto the screen by the lighting pass.
+    Glows of the same radius and colour share one texture.
     """
 
-    def __init__(self, time_to_pass: float):
-        self.time_to_pass = time_to_pass
-        self.start = time.perf_counter()
+    __slots__ = ("radius", "color", "offset")
 
-    def update(self) -> bool:
-        if time.perf_counter() - self.start > self.time_to_pass:
-            self.start = time.perf_counter()
-            return True
-        return False
+    def __init__(self, radius: int, color, offset: tuple = (0, 0)):
+        self.radius = radius
+        self.color = tuple(pygame.Color(color))[:3]
+        # From the entity's position to the centre of the light
+        self.offset = offset
 
 
 class Expansion:
@@ -0,0 +1,37 @@
+"""
+This file is a part of the 'ecs-pygame' source code.
+The source code is distributed under the MIT license.
+"""
+
+import pygame
+
+from game.generics import Events
+
+
+class EventBus:
+    """
+    Sorts pygame events by type into the queues of whoever subscribed to
+    that type, in one pass per frame. Each subscriber reads and clears its
+    own queue, so events nobody wants cost one lookup, and subscribers
+    don't slow each other down.
+    """
+
+    def __init__(self):
+        self.queues: dict[int, list[list[pygame.event.Event]]] = {}
+
+    def subscribe(self, event_type: int) -> list[pygame.event.Event]:
+        """
+        :return: Queue that every dispatched event of `event_type` is
+        added to, until the subscriber clears it
+        """
+        queue = []
+        self.queues.setdefault(event_type, []).append(queue)
+        return queue
+
+    def dispatch(self, events: Events):
+        queues = self.queues
+        for event in events:
+            subscribers = queues.get(event.type)
+            if subscribers is not None:
+                for queue in subscribers:
+                    queue.append(event)
@@ -0,0 +1,66 @@
+"""
+This file is a part of the 'ecs-pygame' source code.
+The source code is distributed under the MIT license.
+"""
+
+
+class FrameGovernor:
+    """
+    Compares the time each frame's work takes with the frame budget, and
+    moves a degradation level up while frames run over budget and back
+    down once there is headroom again. The two thresholds are apart and a
+    move needs a run of frames past one, so the level doesn't flicker
+    when frames take about as long as the budget.
+    """
+
+    MAX_LEVEL = 3
+    # Fractions of the budget
+    OVER_BUDGET = 1.0
+    HEADROOM = 0.7
+    # Frames in a row past a threshold before the level moves
+    DEGRADE_FRAMES = 15
+    RECOVER_FRAMES = 120
+    # Weight of the newest frame in the smoothed load, so single slow
+    # frames don't reset a recovery
+    SMOOTHING = 0.1
+
+    def __init__(self, budget: float, max_level: int = MAX_LEVEL):
+        """
+        :param budget: Seconds a frame may take
+        """
+        self.budget = budget
+        self.max_level = max_level
+        self.level = 0
+        # Smoothed fraction of the budget that frames use
+        self.load = 0.0
+        self.over_frames = 0
+        self.under_frames = 0
+
+    def end_frame(self, work_time: float) -> bool:
+        """
+        :param work_time: Seconds the frame's work took, not counting the
+        wait for the frame cap
+        :return: Whether the level changed
+        """
+        self.load += (work_time / self.budget - self.load) * self.SMOOTHING
+        if self.load > self.OVER_BUDGET:
+            self.over_frames += 1
+            self.under_frames = 0
+        elif self.load < self.HEADROOM:
+            self.under_frames += 1
+            self.over_frames = 0
+        else:
+            self.over_frames = self.under_frames = 0
+
+        if (
+            self.over_frames >= self.DEGRADE_FRAMES
+            and self.level < self.max_level
+        ):
+            self.level += 1
+            self.over_frames = 0
+            return True
+        if self.under_frames >= self.RECOVER_FRAMES and self.level > 0:
+            self.level -= 1
+            self.under_frames = 0
+            return True
+        return False
@@ -0,0 +1,85 @@
+"""
+This file is a part of the 'ecs-pygame' source code.
+The source code is distributed under the MIT license.
+"""
+
+import functools
+import math
+from typing import Iterable
+
+import pygame
+
+# Distinct (radius, colour) pairs kept, a level only uses a handful
+LIGHT_CACHE_SIZE = 128
+
+
+@functools.lru_cache(maxsize=LIGHT_CACHE_SIZE)
+def circle_surf(radius: int, color: tuple[int, int, int]) -> pygame.Surface:
+    """
+    Radial light that fades from `color` in the middle to black at
+    `radius`. Shared by every caller, so it must not be drawn on.
+    """
+    surf = pygame.Surface((radius * 2, radius * 2))
+    for ring in range(radius, 0, -1):
+        strength = (1 - (ring - 1) / radius) ** 2
+        pygame.draw.circle(
+            surf,
+            [round(channel * strength) for channel in color],
+            (radius, radius),
+            ring,
+        )
+    return surf
+
+
+class LightMap:
+    """
+    Low resolution layer that lights are added into each frame, then
+    scaled up and added onto the screen in one blit. The cost per light
+    is one small blit, however large it is on screen.
+    """
+
+    # Screen pixels per light map pixel
+    SCALE = 4
+
+    def __init__(self, size: tuple[int, int], scale: int = SCALE):
+        self.size = size
+        self.scale = scale
+        self.surf = pygame.Surface(
+            (math.ceil(size[0] / scale), math.ceil(size[1] / scale))
+        )
+        self.scaled = pygame.Surface(size)
+
+    def texture(self, radius: int, color: tuple) -> pygame.Surface:
+        return circle_surf(max(1, round(radius / self.scale)), color)
+
+    def draw(
+        self,
+        screen: pygame.Surface,
+        lights: Iterable[tuple[float, float, int, tuple]],
+    ) -> int:
+        """
+        :param lights: (x, y, radius, colour) of each light, centred on
+        (x, y) in screen coordinates
+        :return: How many lights were drawn
+        """
+        scale = self.scale
+        blits = []
+        for x, y, radius, color in lights:
+            texture = self.texture(radius, color)
+            half = texture.get_width() // 2
+            blits.append(
+                (
+                    texture,
+                    (int(x / scale) - half, int(y / scale) - half),
+                    None,
+                    pygame.BLEND_RGB_ADD,
+                )
+            )
+        if not blits:
+            return 0
+
+        self.surf.fill((0, 0, 0))
+        self.surf.blits(blits, doreturn=False)
+        pygame.transform.smoothscale(self.surf, self.size, self.scaled)
+        screen.blit(self.scaled, (0, 0), special_flags=pygame.BLEND_RGB_ADD)
+        return len(blits)
@@ -3,32 +3,304 @@ This file is a part of the 'ecs-pygame' source code.
 The source code is distributed under the MIT license.
 """
 
+import math
+from array import array
+from collections import OrderedDict
+from typing import Callable, Iterator, Optional, Sequence
+
 import esper
 import pygame
 
-from game.components import CollisionTile, SkeletonSpawnerTile, Tile
-from game.generics import Assets
+from game.components import SkeletonSpawnerTile
+
+
+class TileLayer:
+    """
+    Grid of tile ids stored in one compact array, with the tileset that
+    the ids index into. Rendering and collision query it by coordinate.
+    """
+
+    EMPTY = 255
+    SOLID_TILES = frozenset((1,))
+
+    __slots__ = (
+        "width",
+        "height",
+        "tile_size",
+        "tile_set",
+        "tiles",
+        "observers",
+    )
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        tile_size: int,
+        tile_set: Sequence[pygame.Surface],
+    ):
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.tile_set = tile_set
+        self.tiles = array("B", [self.EMPTY]) * (width * height)
+        # Called with (col, row) whenever a tile changes
+        self.observers: list[Callable[[int, int], None]] = []
+
+    @property
+    def rect(self) -> pygame.Rect:
+        """
+        :return: Area the layer covers in world coordinates
+        """
+        return pygame.Rect(
+            0, 0, self.width * self.tile_size, self.height * self.tile_size
+        )
+
+    def get(self, col: int, row: int) -> int:
+        if 0 <= col < self.width and 0 <= row < self.height:
+            return self.tiles[row * self.width + col]
+        return self.EMPTY
+
+    def set(self, col: int, row: int, tile_id: int):
+        self.tiles[row * self.width + col] = tile_id
+        for observer in self.observers:
+            observer(col, row)
+
+    def is_solid(self, col: int, row: int) -> bool:
+        return self.get(col, row) in self.SOLID_TILES
+
+    def collides(self, rect: pygame.Rect) -> bool:
+        """
+        :param rect: Rect in world coordinates
+        :return: Whether the rect overlaps any solid tile
+        """
+        if not (rect.width and rect.height):
+            return False
+
+        size = self.tile_size
+        width = self.width
+        tiles = self.tiles
+        solid = self.SOLID_TILES
+        cols = range(
+            max(rect.left // size, 0), min((rect.right - 1) // size + 1, width)
+        )
+        for row in range(
+            max(rect.top // size, 0),
+            min((rect.bottom - 1) // size + 1, self.height),
+        ):
+            start = row * width
+            for col in cols:
+                if tiles[start + col] in solid:
+                    return True
+        return False
+
+
+class StaticTileLayer:
+    """
+    A `TileLayer` baked into fixed-size chunk surfaces, each the first
+    time it is drawn. A chunk is only redrawn after one of its tiles
+    changes. At most `max_chunks` are kept, the least recently drawn
+    ones are dropped first.
+    """
+
+    CHUNK_TILES = 32
+    # Enough for several screens' worth of chunks
+    MAX_CHUNKS = 32
+
+    __slots__ = (
+        "layer",
+        "chunk_tiles",
+        "chunk_size",
+        "max_chunks",
+        "columns",
+        "rows",
+        "chunks",
+        "dirty",
+    )
+
+    def __init__(
+        self,
+        layer: TileLayer,
+        chunk_tiles: int = CHUNK_TILES,
+        max_chunks: int = MAX_CHUNKS,
+    ):
+        self.layer = layer
+        self.chunk_tiles = chunk_tiles
+        self.chunk_size = chunk_tiles * layer.tile_size
+        self.max_chunks = max_chunks
+        self.columns = math.ceil(layer.width / chunk_tiles)
+        self.rows = math.ceil(layer.height / chunk_tiles)
+        self.chunks: OrderedDict[tuple[int, int], pygame.Surface] = (
+            OrderedDict()
+        )
+        # Baked chunks with tiles changed since
+        self.dirty: set[tuple[int, int]] = set()
+        layer.observers.append(self.mark_dirty)
+
+    def chunk_of(self, col: int, row: int) -> tuple[int, int]:
+        return col // self.chunk_tiles, row // self.chunk_tiles
+
+    def mark_dirty(self, col: int, row: int):
+        chunk = self.chunk_of(col, row)
+        if chunk in self.chunks:
+            self.dirty.add(chunk)
+
+    def _new_chunk(self, chunk: tuple[int, int]) -> pygame.Surface:
+        layer = self.layer
+        cols = min(self.chunk_tiles, layer.width - chunk[0] * self.chunk_tiles)
+        rows = min(
+            self.chunk_tiles, layer.height - chunk[1] * self.chunk_tiles
+        )
+        surf = pygame.Surface((cols * layer.tile_size, rows * layer.tile_size))
+        if pygame.display.get_surface() is not None:
+            surf = surf.convert()
+        return surf
+
+    def _bake(self, chunk: tuple[int, int]) -> pygame.Surface:
+        surf = self.chunks.get(chunk)
+        if surf is None:
+            surf = self.chunks[chunk] = self._new_chunk(chunk)
+        else:
+            # Tiles changed to empty ones leave nothing behind
+            surf.fill((0, 0, 0, 0))
+
+        layer = self.layer
+        size = layer.tile_size
+        start_col = chunk[0] * self.chunk_tiles
+        start_row = chunk[1] * self.chunk_tiles
+        end_col = min(start_col + self.chunk_tiles, layer.width)
+        blits = []
+        for row in range(
+            start_row, min(start_row + self.chunk_tiles, layer.height)
+        ):
+            offset = row * layer.width
+            for col in range(start_col, end_col):
+                tile_id = layer.tiles[offset + col]
+                if tile_id != layer.EMPTY:
+                    blits.append(
+                        (
+                            layer.tile_set[tile_id],
+                            (
+                                (col - start_col) * size,
+                                (row - start_row) * size,
+                            ),
+                        )
+                    )
+        surf.blits(blits, doreturn=False)
+        return surf
+
+    def bake(self):
+        """
+        Redraws every baked chunk that has changed since it was baked.
+        """
+        for chunk in self.dirty:
+            self._bake(chunk)
+        self.dirty.clear()
+
+    def chunks_in(
+        self, area: pygame.Rect
+    ) -> Iterator[tuple[tuple[int, int], pygame.Surface]]:
+        """
+        Bakes the chunks `area` overlaps that aren't yet, then drops the
+        least recently drawn ones over `max_chunks`.
+
+        :param area: Rect in world coordinates
+        :return: The chunks that `area` overlaps
+        """
+        size = self.chunk_size
+        chunks = self.chunks
+        found = []
+        for chunk_y in range(
+            max(area.top // size, 0),
+            min((area.bottom - 1) // size + 1, self.rows),
+        ):
+            for chunk_x in range(
+                max(area.left // size, 0),
+                min((area.right - 1) // size + 1, self.columns),
+            ):
+                chunk = chunk_x, chunk_y
+                surf = chunks.get(chunk)
+                if surf is None:
+                    surf = self._bake(chunk)
+                else:
+                    chunks.move_to_end(chunk)
+                found.append((chunk, surf))
+
+        # Never drops the chunks just found
+        while len(chunks) > max(self.max_chunks, len(found)):
+            chunk, _ = chunks.popitem(last=False)
+            self.dirty.discard(chunk)
+        return iter(found)
+
+    def draw(self, screen: pygame.Surface, view: Optional[pygame.Rect] = None):
+        """
+        :param view: Area of the world shown on screen, defaults to the
+        screen's own rect
+        """
+        if self.dirty:
+            self.bake()
+        if view is None:
+            view = screen.get_rect()
+        for (chunk_x, chunk_y), surf in self.chunks_in(view):
+            screen.blit(
+                surf,
+                (
+                    chunk_x * self.chunk_size - view.x,
+                    chunk_y * self.chunk_size - view.y,
+                ),
+            )
+
+    def draw_area(
+        self,
+        screen: pygame.Surface,
+        area: pygame.Rect,
+        view: Optional[pygame.Rect] = None,
+    ):
+        """
+        Redraws only the part of the layer under `area`.
+
+        :param area: Rect in screen coordinates
+        :param view: Area of the world shown on screen
+        """
+        if self.dirty:
+            self.bake()
+        view_x, view_y = (0, 0) if view is None else view.topleft
+        world_area = area.move(view_x, view_y)
+        for (chunk_x, chunk_y), surf in self.chunks_in(world_area):
+            origin_x = chunk_x * self.chunk_size
+            origin_y = chunk_y * self.chunk_size
+            clip = world_area.clip(surf.get_rect(topleft=(origin_x, origin_y)))
+            if clip:
+                screen.blit(
+                    surf,
+                    clip.move(-view_x, -view_y),
+                    clip.move(-origin_x, -origin_y),
+                )
+
+
+# Map characters to tile ids, which index the tile set
+TILE_IDS = {".": 0, "x": 1, "s": 2}
 
 
 def load_map(
     world: esper.World, level_map: list[str], tile_set, tile_size: int
 ):
-    tile_images = {".": tile_set[0], "x": tile_set[1], "s": tile_set[2]}
-    for row_number, row in enumerate(level_map):
-        for col_number, col in enumerate(row.split(" ")[:-1]):
-            image = tile_images[col]
-            rect = pygame.Rect(
-                (col_number * tile_size, row_number * tile_size),
-                (tile_size, tile_size),
-            )
-            if col == ".":
-                tile = Tile(image, rect.topleft)
-            elif col == "x":
-                tile = CollisionTile(rect)
-                world.create_entity(tile, Tile(image, rect.topleft))
-                continue
-            elif col == "s":
-                tile = SkeletonSpawnerTile(image, rect.topleft)
-                world.create_entity(tile, Tile(image, rect.topleft))
-                continue
-            world.create_entity(tile)
+    rows = [row.split(" ")[:-1] for row in level_map]
+    width, height = max(map(len, rows)), len(rows)
+    tile_layer = TileLayer(width, height, tile_size, tile_set)
+    for row_number, row in enumerate(rows):
+        start = row_number * width
+        tile_layer.tiles[start : start + len(row)] = array(
+            "B", [TILE_IDS[col] for col in row]
+        )
+        for col_number, col in enumerate(row):
+            if col == "s":
+                world.create_entity(
+                    SkeletonSpawnerTile(
+                        tile_set[TILE_IDS[col]],
+                        (col_number * tile_size, row_number * tile_size),
+                    )
+                )
+
+    static_layer = StaticTileLayer(tile_layer)
+    world.create_entity(tile_layer, static_layer)
@@ -0,0 +1,170 @@
+"""
+This file is a part of the 'ecs-pygame' source code.
+The source code is distributed under the MIT license.
+"""
+
+import sys
+import tracemalloc
+from array import array
+from typing import Iterable, Iterator
+
+import pygame
+
+from game.generics import Assets
+from game.utils.sprites import RotationCache
+from game.utils.world import World
+
+# Attribute values a component owns, as opposed to ones it points to
+OWNED_TYPES = (set, list, dict, tuple, array, pygame.Rect, pygame.Vector2)
+
+
+def surface_bytes(surface: pygame.Surface) -> int:
+    """
+    :return: Bytes of pixel data the surface holds, 0 for subsurfaces as
+    their pixels belong to the parent
+    """
+    if surface.get_parent() is not None:
+        return 0
+    return surface.get_pitch() * surface.get_height()
+
+
+def _surfaces(value) -> Iterator[pygame.Surface]:
+    """
+    :return: The surfaces held by an asset or a component's attribute
+    """
+    if isinstance(value, pygame.Surface):
+        yield value
+    elif isinstance(value, RotationCache):
+        yield value.image
+        yield from value.rotations.values()
+    elif isinstance(value, (list, tuple, dict)):
+        items = value.values() if isinstance(value, dict) else value
+        for item in items:
+            if isinstance(item, pygame.Surface):
+                yield item
+
+
+def _attributes(component) -> Iterator:
+    for cls in type(component).__mro__:
+        for name in cls.__dict__.get("__slots__", ()):
+            if hasattr(component, name):
+                yield getattr(component, name)
+    yield from getattr(component, "__dict__", {}).values()
+
+
+def _unseen_bytes(surfaces: Iterable[pygame.Surface], seen: set) -> int:
+    total = 0
+    for surface in surfaces:
+        if id(surface) not in seen:
+            seen.add(id(surface))
+            total += surface_bytes(surface)
+    return total
+
+
+class MemoryTracker:
+    """
+    Breaks a world's memory use down by component type and by asset.
+    Surfaces are counted once, by whichever asset or component is found
+    holding them first.
+
+    While tracemalloc traces, which `start_tracing` turns on, reports
+    also give the Python heap and the lines whose allocations changed
+    the most since the previous report.
+    """
+
+    TOP_LINES = 10
+
+    def __init__(self, world: World, assets: Assets):
+        self.world = world
+        self.assets = assets
+        self.previous = (
+            self.take_snapshot() if tracemalloc.is_tracing() else None
+        )
+
+    @staticmethod
+    def start_tracing(frames: int = 1):
+        """
+        Start before loading anything for the heap to be fully traced.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    @staticmethod
+    def take_snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            )
+        )
+
+    def report(self) -> dict:
+        """
+        :return: Bytes per asset, and count, bytes and surface bytes per
+        component type
+        """
+        seen = set()
+        assets = {
+            name: _unseen_bytes(_surfaces(value), seen)
+            for name, value in self.assets.items()
+        }
+
+        components: dict[str, dict[str, int]] = {}
+        counted = set()
+        for entity, entity_components in self.world.entities():
+            for component in entity_components.values():
+                # Shared instances, like a Glow, are counted once
+                if id(component) in counted:
+                    continue
+                counted.add(id(component))
+
+                size = sys.getsizeof(component)
+                owned_surfaces = 0
+                for value in _attributes(component):
+                    if isinstance(value, OWNED_TYPES):
+                        size += sys.getsizeof(value)
+                    owned_surfaces += _unseen_bytes(_surfaces(value), seen)
+                stats = components.setdefault(
+                    type(component).__name__,
+                    {"count": 0, "bytes": 0, "surface_bytes": 0},
+                )
+                stats["count"] += 1
+                stats["bytes"] += size
+                stats["surface_bytes"] += owned_surfaces
+
+        entities = self.world.entity_count
+        component_bytes = sum(stats["bytes"] for stats in components.values())
+        report = {
+            "entities": entities,
+            "component_bytes": component_bytes,
+            "bytes_per_entity": component_bytes / entities if entities else 0,
+            "components": components,
+            "assets": assets,
+        }
+        if tracemalloc.is_tracing():
+            report["heap"] = self.heap_report(entities)
+        return report
+
+    def heap_report(self, entities: int) -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = self.take_snapshot()
+        if self.previous is None:
+            stats = snapshot.statistics("lineno")
+        else:
+            stats = snapshot.compare_to(self.previous, "lineno")
+        self.previous = snapshot
+
+        return {
+            "current": current,
+            "peak": peak,
+            "per_entity": current / entities if entities else 0,
+            "top_lines": [
+                {
+                    "where": f"{stat.traceback[0].filename}:"
+                    f"{stat.traceback[0].lineno}",
+                    "bytes": stat.size,
+                    "growth": getattr(stat, "size_diff", stat.size),
+                }
+                for stat in stats[: self.TOP_LINES]
+            ],
+        }
@@ -0,0 +1,290 @@
+"""
+This file is a part of the 'ecs-pygame' source code.
+The source code is distributed under the MIT license.
+"""
+
+from array import array
+from collections import deque
+from typing import Optional
+
+import pygame
+
+from game.generics import Pos
+from game.utils.maps import TileLayer
+
+NEIGHBOURS = (
+    (1, 0),
+    (-1, 0),
+    (0, 1),
+    (0, -1),
+    (1, 1),
+    (1, -1),
+    (-1, 1),
+    (-1, -1),
+)
+
+
+class FlowField:
+    """
+    Distance map over a tile layer towards a single target tile, up to
+    `MAX_DISTANCE` tiles away from it. Steering an entity picks the
+    neighbouring cell closest to the target, remembered per cell until
+    the target moves.
+
+    Cells further than `MAX_DISTANCE` along a path get no waypoint, like
+    unreachable ones, so entities there head straight for the target and
+    can get stuck on walls until they come within range.
+
+    A cell only counts as walkable if an agent of `agent_size` centred on
+    it doesn't touch a wall, so paths avoid gaps the agent can't fit in.
+    """
+
+    UNREACHABLE = -1
+    # How far to look for a walkable cell when the target is in a tight spot
+    SEED_RADIUS = 2
+    # Bounds the search, in tiles along a path, so moving the target
+    # costs the same on any map
+    MAX_DISTANCE = 64
+
+    def __init__(
+        self, tile_layer: TileLayer, agent_size: tuple[int, int] = (1, 1)
+    ):
+        self.tile_layer = tile_layer
+        self.width = tile_layer.width
+        self.height = tile_layer.height
+        self.tile_size = tile_layer.tile_size
+        self.agent_size = agent_size
+        self.target_cell = None
+
+        cells = self.width * self.height
+        self.walkable = bytearray(cells)
+        # Per cell, the indices of its walkable orthogonal neighbours, and
+        # of every neighbour it can step to without cutting a corner
+        self.links: list[tuple[int, ...]] = [()] * cells
+        self.steps: list[tuple[int, ...]] = [()] * cells
+        self.footprint = self._footprint()
+        # Index offset of each entry of NEIGHBOURS
+        self.offsets = tuple(dy * self.width + dx for dx, dy in NEIGHBOURS)
+        self.patterns = self._patterns()
+        self._compute_region(0, 0, self.width, self.height)
+        tile_layer.observers.append(self._on_tile_change)
+        self.distance = array("l", [self.UNREACHABLE]) * cells
+        # Cells the last search reached, the only ones to reset
+        self.reached: list[int] = []
+        # Waypoints looked up since the last search
+        self.waypoints: dict[int, Optional[tuple[float, float]]] = {}
+
+    def _footprint(self) -> tuple[tuple[int, int], ...]:
+        """
+        :return: Offsets from a cell of the tiles an agent centred on it
+        touches
+        """
+        size = self.tile_size
+        agent_rect = pygame.Rect((0, 0), self.agent_size)
+        agent_rect.center = (size / 2, size / 2)
+        return tuple(
+            (dx, dy)
+            for dy in range(
+                agent_rect.top // size, (agent_rect.bottom - 1) // size + 1
+            )
+            for dx in range(
+                agent_rect.left // size, (agent_rect.right - 1) // size + 1
+            )
+        )
+
+    def _compute_region(self, left: int, top: int, right: int, bottom: int):
+        """
+        Recomputes which cells from (left, top) to (right, bottom), not
+        included, are walkable, then the links and steps of those cells
+        and of their neighbours.
+        """
+        width, height = self.width, self.height
+        tiles = self.tile_layer.tiles
+        solid = self.tile_layer.SOLID_TILES
+        walkable = self.walkable
+        footprint = self.footprint
+        left, top = max(left, 0), max(top, 0)
+        right, bottom = min(right, width), min(bottom, height)
+        for row in range(top, bottom):
+            for col in range(left, right):
+                walkable[row * width + col] = not any(
+                    0 <= col + dx < width
+                    and 0 <= row + dy < height
+                    and tiles[(row + dy) * width + col + dx] in solid
+                    for dx, dy in footprint
+                )
+
+        links = self.links
+        steps = self.steps
+        patterns = self.patterns
+        o0, o1, o2, o3, o4, o5, o6, o7 = self.offsets
+        for row in range(max(top - 1, 0), min(bottom + 1, height)):
+            inner_row = 0 < row < height - 1
+            for col in range(max(left - 1, 0), min(right + 1, width)):
+                i = row * width + col
+                if inner_row and 0 < col < width - 1:
+                    mask = (
+                        walkable[i + o0]
+                        | walkable[i + o1] << 1
+                        | walkable[i + o2] << 2
+                        | walkable[i + o3] << 3
+                        | walkable[i + o4] << 4
+                        | walkable[i + o5] << 5
+                        | walkable[i + o6] << 6
+                        | walkable[i + o7] << 7
+                    )
+                else:
+                    mask = 0
+                    for bit, (dx, dy) in enumerate(NEIGHBOURS):
+                        if self._walkable(col + dx, row + dy):
+                            mask |= 1 << bit
+                link_offsets, step_offsets = patterns[mask]
+                links[i] = tuple(map(i.__add__, link_offsets))
+                steps[i] = tuple(map(i.__add__, step_offsets))
+
+    def _patterns(self) -> list[tuple[tuple[int, ...], tuple[int, ...]]]:
+        """
+        :return: For each mask of walkable neighbours, one bit per entry
+        of NEIGHBOURS, the offsets of the links and of the steps
+        """
+        patterns = []
+        for mask in range(1 << len(NEIGHBOURS)):
+            open_steps = {
+                step
+                for bit, step in enumerate(NEIGHBOURS)
+                if mask & (1 << bit)
+            }
+            links = tuple(
+                offset
+                for step, offset in zip(NEIGHBOURS[:4], self.offsets)
+                if step in open_steps
+            )
+            # Diagonals don't cut corners around walls
+            steps = tuple(
+                offset
+                for (dx, dy), offset in zip(NEIGHBOURS, self.offsets)
+                if (dx, dy) in open_steps
+                and (
+                    not (dx and dy)
+                    or ((dx, 0) in open_steps and (0, dy) in open_steps)
+                )
+            )
+            patterns.append((links, steps))
+        return patterns
+
+    def _on_tile_change(self, col: int, row: int):
+        # Only cells whose footprint covers the tile can change
+        dxs = [dx for dx, _ in self.footprint]
+        dys = [dy for _, dy in self.footprint]
+        self._compute_region(
+            col - max(dxs),
+            row - max(dys),
+            col - min(dxs) + 1,
+            row - min(dys) + 1,
+        )
+        # Forces the next update to search again
+        self.target_cell = None
+
+    def cell_of(self, pos: Pos) -> tuple[int, int]:
+        return int(pos[0] // self.tile_size), int(pos[1] // self.tile_size)
+
+    def _inside(self, col: int, row: int) -> bool:
+        return 0 <= col < self.width and 0 <= row < self.height
+
+    def _walkable(self, col: int, row: int) -> bool:
+        return self._inside(col, row) and self.walkable[row * self.width + col]
+
+    def update(self, target: Pos) -> bool:
+        """
+        Recomputes the field if the target moved into a new tile.
+
+        :return: Whether the field was recomputed
+        """
+        cell = self.cell_of(target)
+        if cell == self.target_cell:
+            return False
+
+        self.target_cell = cell
+        self._compute_distances(cell)
+        return True
+
+    def _compute_distances(self, start: tuple[int, int]):
+        width = self.width
+        distance = self.distance
+        unreachable = self.UNREACHABLE
+        for i in self.reached:
+            distance[i] = unreachable
+        reached = self.reached = []
+        self.waypoints.clear()
+
+        seeds = []
+        start_col, start_row = start
+        radius = 0 if self._walkable(*start) else self.SEED_RADIUS
+        for row in range(start_row - radius, start_row + radius + 1):
+            for col in range(start_col - radius, start_col + radius + 1):
+                if self._walkable(col, row):
+                    seed_distance = max(
+                        abs(col - start_col), abs(row - start_row)
+                    )
+                    i = row * width + col
+                    distance[i] = seed_distance
+                    reached.append(i)
+                    seeds.append((seed_distance, col, row, i))
+
+        queue = deque(seed[3] for seed in sorted(seeds))
+        links = self.links
+        max_distance = self.MAX_DISTANCE
+        while queue:
+            i = queue.popleft()
+            next_distance = distance[i] + 1
+            if next_distance > max_distance:
+                continue
+            for n in links[i]:
+                if distance[n] == unreachable:
+                    distance[n] = next_distance
+                    reached.append(n)
+                    queue.append(n)
+
+    def cell_waypoint(
+        self, col: int, row: int
+    ) -> Optional[tuple[float, float]]:
+        """
+        :return: Centre of the neighbouring cell closest to the target, or
+        None when the cell is the target's, or can't reach it
+        """
+        if not self._inside(col, row):
+            return None
+        i = row * self.width + col
+        try:
+            return self.waypoints[i]
+        except KeyError:
+            waypoint = self.waypoints[i] = self._find_waypoint(i)
+            return waypoint
+
+    def _find_waypoint(self, i: int) -> Optional[tuple[float, float]]:
+        distance = self.distance
+        best = distance[i]
+        if best <= 0:
+            return None
+
+        best_cell = None
+        unreachable = self.UNREACHABLE
+        for n in self.steps[i]:
+            n_distance = distance[n]
+            if unreachable < n_distance < best:
+                best = n_distance
+                best_cell = n
+
+        if best_cell is None:
+            return None
+        n_row, n_col = divmod(best_cell, self.width)
+        size = self.tile_size
+        return (n_col + 0.5) * size, (n_row + 0.5) * size
+
+    def waypoint(self, pos: Pos) -> Optional[tuple[float, float]]:
+        """
+        :param pos: Position in world coordinates
+        :return: Point to steer towards, or None when the position is in the
+        target tile or can't reach it
+        """
+        return self.cell_waypoint(*self.cell_of(pos))
@@ -0,0 +1,48 @@
+"""
+This file is a part of the 'ecs-pygame' source code.
+The source code is distributed under the MIT license.
+"""
+
+from typing import Callable, Optional
+
+
+class EntityPool:
+    """
+    Free list of component tuples from released entities. New entities
+    take their components from here and reset them in place, instead of
+    allocating fresh ones. `ceiling` caps how many entities can be live.
+    """
+
+    def __init__(
+        self, factory: Callable[[], tuple], ceiling: Optional[int] = None
+    ):
+        self.factory = factory
+        self.ceiling = ceiling
+        self.free: list[tuple] = []
+        self.live: dict[int, tuple] = {}
+
+    def __len__(self) -> int:
+        return len(self.live)
+
+    def __contains__(self, entity: int) -> bool:
+        return entity in self.live
+
+    @property
+    def full(self) -> bool:
+        return self.ceiling is not None and len(self.live) >= self.ceiling
+
+    def acquire(self) -> tuple:
+        """
+        :return: Components to reset and attach to a new entity
+        """
+        if self.free:
+            return self.free.pop()
+        return self.factory()
+
+    def add(self, entity: int, components: tuple):
+        self.live[entity] = components
+
+    def release(self, entity: int) -> tuple:
+        components = self.live.pop(entity)
+        self.free.append(components)
+        return components
@@ -0,0 +1,245 @@
+"""
+This file is a part of the 'ecs-pygame' source code.
+The source code is distributed under the MIT license.
+"""
+
+import json
+import statistics
+import time
+from collections import Counter, deque
+from typing import Optional, Sequence
+
+import esper
+import pygame
+
+
+class ProcessorStats:
+    """
+    Rolling window of one processor's timings, in seconds.
+    """
+
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)
+        self.entity_count = None
+        self.counters: Optional[dict[str, int]] = None
+
+    @property
+    def min(self) -> float:
+        return min(self.samples, default=0.0)
+
+    @property
+    def mean(self) -> float:
+        return statistics.fmean(self.samples) if self.samples else 0.0
+
+    def percentile(self, percent: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[
+            min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        ]
+
+    @property
+    def p99(self) -> float:
+        return self.percentile(99)
+
+
+class ProcessorProfiler:
+    """
+    Times every call to the given processors' `process` method. Disabled
+    profilers leave the processors untouched, so they cost nothing.
+
+    Processors can set an `entity_count` attribute while processing, it
+    is reported next to their timings, as are the values of a `counters`
+    dict attribute. Values put in `metrics` are shown with the frame time
+    and traced as counters.
+
+    Processors are reported by class name, numbered when a class has more
+    than one instance. Traces keep the latest `max_trace_events` events.
+    """
+
+    WINDOW = 240
+    FONT_SIZE = 14
+    # A few minutes of play at 60 FPS, about 12MB
+    MAX_TRACE_EVENTS = 100_000
+
+    def __init__(
+        self,
+        processors: Sequence[esper.Processor],
+        window: int = WINDOW,
+        trace: bool = False,
+        max_trace_events: int = MAX_TRACE_EVENTS,
+    ):
+        self.processors = list(processors)
+        self.window = window
+        self.trace = trace
+        self.enabled = False
+        self.names = self.names_of(self.processors)
+        self.stats = {
+            processor: ProcessorStats(window) for processor in self.processors
+        }
+        self.frame_times = deque(maxlen=window)
+        # (name, start, end) of spans, or (name, time, metrics) of counters
+        self.trace_events: deque[tuple] = deque(maxlen=max_trace_events)
+        self.metrics: dict[str, float] = {}
+        self.frame_start = time.perf_counter()
+        self.font = None
+
+    @staticmethod
+    def names_of(
+        processors: Sequence[esper.Processor],
+    ) -> dict[esper.Processor, str]:
+        """
+        :return: The class name of each processor, followed by #1, #2...
+        for classes with several instances
+        """
+        classes = Counter(type(processor) for processor in processors)
+        numbers = Counter()
+        names = {}
+        for processor in processors:
+            name = type(processor).__name__
+            if classes[type(processor)] > 1:
+                numbers[name] += 1
+                name += f"#{numbers[name]}"
+            names[processor] = name
+        return names
+
+    def _wrap(self, processor: esper.Processor):
+        name = self.names[processor]
+        stats = self.stats[processor]
+        process = type(processor).process.__get__(processor)
+
+        def timed_process(*args, **kwargs):
+            start = time.perf_counter()
+            process(*args, **kwargs)
+            end = time.perf_counter()
+            stats.samples.append(end - start)
+            stats.entity_count = getattr(processor, "entity_count", None)
+            stats.counters = getattr(processor, "counters", None)
+            if self.trace:
+                self._add_trace_event(name, start, end)
+
+        processor.process = timed_process
+
+    def enable(self):
+        if self.enabled:
+            return
+        for processor in self.processors:
+            self._wrap(processor)
+        self.enabled = True
+        self.frame_start = time.perf_counter()
+
+    def disable(self):
+        if not self.enabled:
+            return
+        for processor in self.processors:
+            del processor.process
+        self.enabled = False
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+    def _add_trace_event(self, name: str, start: float, end: float):
+        # Kept small, made into trace event dicts when written
+        self.trace_events.append((name, start, end))
+
+    def end_frame(self):
+        """
+        Marks the end of a frame, call it once per game loop iteration.
+        """
+        if not self.enabled:
+            return
+
+        now = time.perf_counter()
+        self.frame_times.append(now - self.frame_start)
+        if self.trace:
+            self._add_trace_event("frame", self.frame_start, now)
+            if self.metrics:
+                self.trace_events.append(("metrics", now, dict(self.metrics)))
+        self.frame_start = now
+
+    def report(self) -> dict[str, dict]:
+        """
+        :return: min, mean and p99 timings in milliseconds, the entity
+        count and the latest counters of every processor
+        """
+        return {
+            self.names[processor]: {
+                "min": stats.min * 1000,
+                "mean": stats.mean * 1000,
+                "p99": stats.p99 * 1000,
+                "entities": stats.entity_count,
+                "counters": dict(stats.counters or {}),
+            }
+            for processor, stats in self.stats.items()
+        }
+
+    def draw(self, screen: pygame.Surface):
+        if not self.enabled:
+            return
+        if self.font is None:
+            self.font = pygame.font.Font(None, self.FONT_SIZE)
+
+        frame_ms = (
+            statistics.fmean(self.frame_times) * 1000
+            if self.frame_times
+            else 0
+        )
+        lines = [
+            f"frame {frame_ms:.2f}ms"
+            + "".join(
+                f" {name}={value}" for name, value in self.metrics.items()
+            )
+            + "  min/mean/p99 ms"
+        ]
+        for name, stats in self.report().items():
+            entities = stats["entities"]
+            lines.append(
+                f"{name.removesuffix('Processor'):<10}"
+                f" {stats['min']:.2f}/{stats['mean']:.2f}/{stats['p99']:.2f}"
+                + ("" if entities is None else f"  n={entities}")
+                + "".join(
+                    f" {counter}={value}"
+                    for counter, value in stats["counters"].items()
+                )
+            )
+
+        y = 2
+        for line in lines:
+            text = self.font.render(line, True, "white", (0, 0, 0))
+            screen.blit(text, (2, y))
+            y += text.get_height()
+
+    def write_trace(self, path: str):
+        """
+        Writes the recorded events in the Chrome trace event format, open
+        it in chrome://tracing or https://ui.perfetto.dev
+        """
+        events = []
+        for name, start, end in self.trace_events:
+            if isinstance(end, dict):
+                events.append(
+                    {
+                        "name": name,
+                        "ph": "C",
+                        "ts": start * 1e6,
+                        "pid": 0,
+                        "args": end,
+                    }
+                )
+            else:
+                events.append(
+                    {
+                        "name": name,
+                        "ph": "X",
+                        "ts": start * 1e6,
+                        "dur": (end - start) * 1e6,
+                        "pid": 0,
+                        "tid": 0,
+                    }
+                )
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,223 @@
+"""
+This file is a part of the 'ecs-pygame' source code.
+The source code is distributed under the MIT license.
+"""
+
+import json
+import struct
+import zlib
+from dataclasses import dataclass, field
+from typing import BinaryIO, Optional
+
+import pygame
+
+from game.generics import Events
+
+MAGIC = b"ECSR"
+VERSION = 2
+# seed, tick rate, skeleton ceiling (0 for none), flags, level size
+HEADER = struct.Struct("<4sBQHIBI")
+ARRAY_STORE_FLAG = 1
+
+# Keys the simulation reads, stored as a bit mask
+RECORDED_KEYS = (pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d)
+
+# Per frame flags, each marks a field that follows
+DT_CHANGED = 1
+KEYS_CHANGED = 2
+MOUSE_MOVED = 4
+CLICKED = 8
+SLOWDOWN_CHANGED = 16
+END = 0xFF
+# Spawn slowdowns are stored in thousandths
+SLOWDOWN_UNIT = 1000
+
+
+def _write_varint(f: BinaryIO, value: int):
+    # Zigzag encoded, so small negative deltas stay small
+    value = (value << 1) ^ (value >> 63)
+    while value > 0x7F:
+        f.write(bytes((value & 0x7F | 0x80,)))
+        value >>= 7
+    f.write(bytes((value,)))
+
+
+def _read_varint(data: bytes, offset: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return (value >> 1) ^ -(value & 1), offset
+        shift += 7
+
+
+class InputRecorder:
+    """
+    Writes the inputs of every frame that the simulation reads. Each
+    field is only stored when it changes, as a delta from its last value.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        seed: int,
+        tick_rate: int,
+        level_map: list[str],
+        max_skeletons: Optional[int] = None,
+        array_store: bool = False,
+    ):
+        self.f = open(path, "wb")
+        level = zlib.compress(json.dumps(level_map).encode())
+        self.f.write(
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                seed,
+                tick_rate,
+                max_skeletons or 0,
+                ARRAY_STORE_FLAG if array_store else 0,
+                len(level),
+            )
+        )
+        self.f.write(level)
+        self.dt_us = 0
+        self.key_mask = 0
+        self.mouse_pos = (0, 0)
+        self.slowdown = SLOWDOWN_UNIT
+
+    def record(
+        self,
+        raw_dt: float,
+        keys,
+        mouse_pos: tuple,
+        events: Events,
+        spawn_slowdown: float = 1.0,
+    ):
+        """
+        :param mouse_pos: The mouse in world coordinates, as the
+        simulation gets it
+        :param spawn_slowdown: See `EntityProcessor.set_spawn_slowdown`,
+        it depends on the frame rate so it's recorded too
+        """
+        dt_us = round(raw_dt * 1_000_000)
+        key_mask = 0
+        for bit, key in enumerate(RECORDED_KEYS):
+            if keys[key]:
+                key_mask |= 1 << bit
+        mouse_pos = round(mouse_pos[0]), round(mouse_pos[1])
+        clicks = sum(event.type == pygame.MOUSEBUTTONDOWN for event in events)
+        slowdown = round(spawn_slowdown * SLOWDOWN_UNIT)
+
+        flags = (
+            (DT_CHANGED if dt_us != self.dt_us else 0)
+            | (KEYS_CHANGED if key_mask != self.key_mask else 0)
+            | (MOUSE_MOVED if mouse_pos != self.mouse_pos else 0)
+            | (CLICKED if clicks else 0)
+            | (SLOWDOWN_CHANGED if slowdown != self.slowdown else 0)
+        )
+        self.f.write(bytes((flags,)))
+        if flags & DT_CHANGED:
+            _write_varint(self.f, dt_us - self.dt_us)
+        if flags & KEYS_CHANGED:
+            self.f.write(bytes((key_mask,)))
+        if flags & MOUSE_MOVED:
+            _write_varint(self.f, mouse_pos[0] - self.mouse_pos[0])
+            _write_varint(self.f, mouse_pos[1] - self.mouse_pos[1])
+        if flags & CLICKED:
+            _write_varint(self.f, clicks)
+        if flags & SLOWDOWN_CHANGED:
+            _write_varint(self.f, slowdown - self.slowdown)
+
+        self.dt_us = dt_us
+        self.key_mask = key_mask
+        self.mouse_pos = mouse_pos
+        self.slowdown = slowdown
+
+    def close(self, digest: bytes):
+        """
+        Ends the recording with the final state's digest.
+        """
+        self.f.write(bytes((END,)))
+        self.f.write(digest)
+        self.f.close()
+
+
+@dataclass
+class Recording:
+    seed: int
+    tick_rate: int
+    max_skeletons: Optional[int]
+    array_store: bool
+    level_map: list[str]
+    # (dt in seconds, key mask, mouse position, clicks, spawn slowdown)
+    # per frame
+    frames: list[tuple[float, int, tuple[int, int], int, float]] = field(
+        default_factory=list
+    )
+    # None if the recording was cut short
+    digest: Optional[bytes] = None
+
+
+def read_recording(path: str) -> Recording:
+    with open(path, "rb") as f:
+        data = f.read()
+
+    (
+        magic,
+        version,
+        seed,
+        tick_rate,
+        max_skeletons,
+        flags,
+        level_size,
+    ) = HEADER.unpack_from(data)
+    # Version 1 is the same, without spawn slowdowns
+    if magic != MAGIC or not 1 <= version <= VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} recording")
+    offset = HEADER.size + level_size
+    recording = Recording(
+        seed,
+        tick_rate,
+        max_skeletons or None,
+        bool(flags & ARRAY_STORE_FLAG),
+        json.loads(zlib.decompress(data[HEADER.size : offset])),
+    )
+
+    dt_us = key_mask = clicks = 0
+    slowdown = SLOWDOWN_UNIT
+    mouse_x = mouse_y = 0
+    while offset < len(data):
+        frame_flags = data[offset]
+        offset += 1
+        if frame_flags == END:
+            recording.digest = data[offset : offset + 20]
+            break
+        if frame_flags & DT_CHANGED:
+            delta, offset = _read_varint(data, offset)
+            dt_us += delta
+        if frame_flags & KEYS_CHANGED:
+            key_mask = data[offset]
+            offset += 1
+        if frame_flags & MOUSE_MOVED:
+            delta_x, offset = _read_varint(data, offset)
+            delta_y, offset = _read_varint(data, offset)
+            mouse_x += delta_x
+            mouse_y += delta_y
+        clicks = 0
+        if frame_flags & CLICKED:
+            clicks, offset = _read_varint(data, offset)
+        if frame_flags & SLOWDOWN_CHANGED:
+            delta, offset = _read_varint(data, offset)
+            slowdown += delta
+        recording.frames.append(
+            (
+                dt_us / 1_000_000,
+                key_mask,
+                (mouse_x, mouse_y),
+                clicks,
+                slowdown / SLOWDOWN_UNIT,
+            )
+        )
+    return recording
@@ -0,0 +1,73 @@
+"""
+This file is a part of the 'ecs-pygame' source code.
+The source code is distributed under the MIT license.
+"""
+
+from itertools import chain
+from operator import itemgetter
+
+import pygame
+
+_depth = itemgetter(0)
+_blit = itemgetter(1)
+
+
+class RenderQueue:
+    """
+    Draw commands gathered over a frame and submitted to SDL in one call.
+    They are drawn by layer, then by depth, like the y of a sprite's feet
+    so that sprites further down overlap those above them. Commands tied
+    on both are drawn in the order they were submitted.
+    """
+
+    def __init__(self):
+        self.layers: dict[int, list[tuple[float, tuple]]] = {}
+
+    def __len__(self) -> int:
+        return sum(map(len, self.layers.values()))
+
+    def layer(self, layer: int) -> list[tuple[float, tuple]]:
+        """
+        :return: The layer's commands, for callers with many of them to
+        append `(depth, (image, dest))` to directly
+        """
+        commands = self.layers.get(layer)
+        if commands is None:
+            commands = self.layers[layer] = []
+        return commands
+
+    def submit(
+        self,
+        image: pygame.Surface,
+        dest: tuple,
+        layer: int = 0,
+        depth: float = 0.0,
+    ):
+        self.layer(layer).append((depth, (image, dest)))
+
+    def flush(
+        self, surface: pygame.Surface, return_rects: bool = False
+    ) -> list[pygame.Rect]:
+        """
+        Draws the queued commands onto `surface` and empties the queue.
+
+        :param return_rects: Whether the areas drawn to are needed, they
+        cost a Rect per command
+        :return: The areas drawn to, or an empty list
+        """
+        layers = [self.layers[layer] for layer in sorted(self.layers)]
+        for commands in layers:
+            commands.sort(key=_depth)
+        blits = map(_blit, chain.from_iterable(layers))
+
+        rects = []
+        if return_rects:
+            rects = surface.blits(blits)
+        elif hasattr(surface, "fblits"):
+            # pygame-ce only
+            surface.fblits(blits)
+        else:
+            surface.blits(blits, doreturn=False)
+        for commands in layers:
+            commands.clear()
+        return rects
@@ -0,0 +1,125 @@
+"""
+This file is a part of the 'ecs-pygame' source code.
+The source code is distributed under the MIT license.
+"""
+
+import heapq
+import itertools
+from typing import Callable, Optional
+
+
+class Timer:
+    """
+    Handle to a callback waiting in a `Scheduler`.
+    """
+
+    __slots__ = ("due", "interval", "callback", "args", "seq")
+
+    def __init__(
+        self,
+        due: float,
+        interval: Optional[float],
+        callback: Callable,
+        args: tuple,
+    ):
+        self.due = due
+        # Seconds between calls for repeating timers, None for one-shots
+        self.interval = interval
+        self.callback = callback
+        self.args = args
+        # Matches the timer's live heap entry, None once it's done
+        self.seq: Optional[int] = None
+
+    @property
+    def active(self) -> bool:
+        return self.seq is not None
+
+
+class Scheduler:
+    """
+    Calls back at points in simulated time. Timers wait in a heap ordered
+    by when they are due, so advancing only costs anything for the timers
+    that fire. Timers due at the same time fire in the order they were
+    scheduled.
+    """
+
+    def __init__(self, time_scale: float = 1.0):
+        self.now = 0.0
+        # Simulated seconds per second passed to `advance`
+        self.time_scale = time_scale
+        self.paused = False
+        self.heap: list[tuple[float, int, Timer]] = []
+        self.counter = itertools.count()
+
+    def _push(self, timer: Timer):
+        timer.seq = next(self.counter)
+        heapq.heappush(self.heap, (timer.due, timer.seq, timer))
+
+    def call_at(self, due: float, callback: Callable, *args) -> Timer:
+        timer = Timer(due, None, callback, args)
+        self._push(timer)
+        return timer
+
+    def call_later(self, delay: float, callback: Callable, *args) -> Timer:
+        return self.call_at(self.now + delay, callback, *args)
+
+    def call_every(
+        self,
+        interval: float,
+        callback: Callable,
+        *args,
+        delay: Optional[float] = None,
+    ) -> Timer:
+        """
+        :param delay: Seconds until the first call, defaults to `interval`
+        """
+        if interval <= 0:
+            raise ValueError("Repeating timers need a positive interval")
+        timer = Timer(
+            self.now + (interval if delay is None else delay),
+            interval,
+            callback,
+            args,
+        )
+        self._push(timer)
+        return timer
+
+    def reschedule(self, timer: Timer, due: float):
+        """
+        Moves the timer to fire at `due` instead, reviving it if it was
+        cancelled or already fired.
+        """
+        timer.due = due
+        self._push(timer)
+
+    def cancel(self, timer: Timer):
+        # Its heap entry is skipped once it comes up
+        timer.seq = None
+
+    def advance(self, dt: float) -> int:
+        """
+        Moves time forwards by `dt` scaled seconds, calling every timer
+        that comes due on the way. Callbacks see `now` at their due time.
+
+        :return: How many timers fired
+        """
+        if self.paused:
+            return 0
+
+        end = self.now + dt * self.time_scale
+        heap = self.heap
+        fired = 0
+        while heap and heap[0][0] <= end:
+            due, seq, timer = heapq.heappop(heap)
+            if seq != timer.seq:
+                continue
+            self.now = max(self.now, due)
+            if timer.interval is None:
+                timer.seq = None
+            else:
+                timer.due = due + timer.interval
+                self._push(timer)
+            timer.callback(*timer.args)
+            fired += 1
+        self.now = end
+        return fired
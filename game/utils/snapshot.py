@@ -0,0 +1,314 @@
+"""
+This file is a part of the 'ecs-pygame' source code.
+The source code is distributed under the MIT license.
+"""
+
+import math
+import random
+import struct
+
+from game.components import (Frames, Movement, PlayerData, Pos, Rectangle,
+                             Skeleton, Sword)
+
+MAGIC = b"ECSS"
+VERSION = 2
+# ticks, scheduler time, accumulator, last entity id, skeleton gen count,
+# spawn slowdown, spawned, killed, then how many players, spawners and
+# skeletons follow
+HEADER = struct.Struct("<4sBQddIBdIIHHI")
+# Mersenne Twister state of the `random` module, and its cached gauss
+RNG = struct.Struct("<625Id")
+RNG_VERSION = 3
+# entity, hp, speed, pos, movement, rect, frames
+SKELETON = struct.Struct("<Iid4d4iHBdb?")
+# entity, pos, movement, rect, frames, speed, then the sword's pos, rect,
+# previous topleft, distance, piercing, angle and how many hits follow
+PLAYER = struct.Struct("<I4d4iHBdb?d2d4i2id?dH")
+# entity, when its spawn timer is due next, the timer's interval
+SPAWNER = struct.Struct("<Idd")
+
+# Values of `Frames.blit_by`, stored by index
+ANCHORS = (
+    "topleft",
+    "midtop",
+    "topright",
+    "midleft",
+    "center",
+    "midright",
+    "bottomleft",
+    "midbottom",
+    "bottomright",
+)
+ANCHOR_IDS = {anchor: i for i, anchor in enumerate(ANCHORS)}
+
+SKELETON_COMPONENTS = (Skeleton, Frames, Rectangle, Pos, Movement)
+PLAYER_COMPONENTS = (PlayerData, Sword, Frames, Rectangle, Pos, Movement)
+
+
+def _skeleton_values(entity: int, row: tuple) -> tuple:
+    skeleton, frames, rect, pos, movement = row
+    return (
+        entity,
+        skeleton.hp,
+        skeleton.speed,
+        pos.x,
+        pos.y,
+        movement.x,
+        movement.y,
+        *rect,
+        frames.clip,
+        ANCHOR_IDS[frames.blit_by],
+        frames.phase,
+        frames.direction,
+        frames.animated_once,
+    )
+
+
+def _restore_skeleton(row: tuple, values: tuple):
+    skeleton, frames, rect, pos, movement = row
+    (
+        _,
+        skeleton.hp,
+        skeleton.speed,
+        pos.x,
+        pos.y,
+        movement.x,
+        movement.y,
+        rect.x,
+        rect.y,
+        rect.width,
+        rect.height,
+        frames.clip,
+        anchor,
+        frames.phase,
+        frames.direction,
+        frames.animated_once,
+    ) = values
+    frames.blit_by = ANCHORS[anchor]
+
+
+def _player_values(entity: int, row: tuple) -> tuple:
+    player_data, sword, frames, rect, pos, movement = row
+    return (
+        entity,
+        pos.x,
+        pos.y,
+        movement.x,
+        movement.y,
+        *rect,
+        frames.clip,
+        ANCHOR_IDS[frames.blit_by],
+        frames.phase,
+        frames.direction,
+        frames.animated_once,
+        player_data.speed,
+        sword.pos.x,
+        sword.pos.y,
+        *sword.rect,
+        *sword.previous_topleft,
+        sword.distance,
+        sword.piercing,
+        sword.angle,
+        len(sword.hits),
+    )
+
+
+def _restore_player(row: tuple, values: tuple, hits: tuple):
+    player_data, sword, frames, rect, pos, movement = row
+    (
+        _,
+        pos.x,
+        pos.y,
+        movement.x,
+        movement.y,
+        rect.x,
+        rect.y,
+        rect.width,
+        rect.height,
+        frames.clip,
+        anchor,
+        frames.phase,
+        frames.direction,
+        frames.animated_once,
+        player_data.speed,
+        sword.pos.x,
+        sword.pos.y,
+        sword.rect.x,
+        sword.rect.y,
+        sword.rect.width,
+        sword.rect.height,
+        previous_x,
+        previous_y,
+        sword.distance,
+        sword.piercing,
+        sword.angle,
+        _,
+    ) = values
+    frames.blit_by = ANCHORS[anchor]
+    sword.previous_topleft = previous_x, previous_y
+    sword.hits = set(hits)
+    # Surfaces aren't stored, the angle picks the same cached rotation
+    sword.image = sword.rotations.get(-sword.angle)
+
+
+def take_snapshot(simulation) -> bytes:
+    """
+    Packs the gameplay state of a `Simulation` into bytes: the time, the
+    RNG, and the players, skeleton spawn timers and skeletons. Surfaces are
+    kept as references, animation clip ids and the sword's angle. The
+    level's tiles aren't stored, they don't change while playing.
+    """
+    world = simulation.world
+    entity_processor = simulation.entity_processor
+    players = world.query(*PLAYER_COMPONENTS)
+    spawn_timers = entity_processor.spawn_timers
+    skeletons = world.query(*SKELETON_COMPONENTS)
+
+    _, state, gauss = random.getstate()
+    parts = [
+        HEADER.pack(
+            MAGIC,
+            VERSION,
+            simulation.ticks,
+            simulation.scheduler.now,
+            simulation.accumulator,
+            world.last_entity_id,
+            entity_processor.skeleton_gen_count,
+            entity_processor.spawn_slowdown,
+            entity_processor.spawned,
+            entity_processor.killed,
+            len(players),
+            len(spawn_timers),
+            len(skeletons),
+        ),
+        RNG.pack(*state, math.nan if gauss is None else gauss),
+    ]
+    for entity, row in players:
+        hits = sorted(row[1].hits)
+        parts.append(PLAYER.pack(*_player_values(entity, row)))
+        parts.append(struct.pack(f"<{len(hits)}I", *hits))
+    for entity, timer in spawn_timers.items():
+        parts.append(SPAWNER.pack(entity, timer.due, timer.interval))
+    pack = SKELETON.pack
+    parts.extend(
+        pack(*_skeleton_values(entity, row)) for entity, row in skeletons
+    )
+    return b"".join(parts)
+
+
+def restore_snapshot(simulation, snapshot: bytes) -> int:
+    """
+    Puts a `Simulation` back into the state of a snapshot taken from it,
+    or from one made with the same level and assets. Entities that still
+    match the snapshot are left alone, so undoing a few ticks only writes
+    what those ticks changed.
+
+    :return: How many entities were written
+    """
+    (
+        magic,
+        version,
+        ticks,
+        now,
+        accumulator,
+        last_entity_id,
+        gen_count,
+        spawn_slowdown,
+        spawned,
+        killed,
+        player_count,
+        spawner_count,
+        skeleton_count,
+    ) = HEADER.unpack_from(snapshot)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a version {VERSION} snapshot")
+
+    world = simulation.world
+    entity_processor = simulation.entity_processor
+    motion_store = simulation.motion_store
+    spatial_index = simulation.spatial_index
+    offset = HEADER.size
+    *state, gauss = RNG.unpack_from(snapshot, offset)
+    offset += RNG.size
+    random.setstate(
+        (RNG_VERSION, tuple(state), None if math.isnan(gauss) else gauss)
+    )
+
+    written = 0
+    players = world.query(*PLAYER_COMPONENTS).rows
+    for _ in range(player_count):
+        values = PLAYER.unpack_from(snapshot, offset)
+        offset += PLAYER.size
+        hits = struct.unpack_from(f"<{values[-1]}I", snapshot, offset)
+        offset += 4 * len(hits)
+        entity = values[0]
+        row = players.get(entity)
+        if row is None:
+            raise ValueError(f"Player {entity} is not in the world")
+        if (
+            _player_values(entity, row) != values
+            or tuple(sorted(row[1].hits)) != hits
+        ):
+            _restore_player(row, values, hits)
+            spatial_index.move(entity, values[1], values[2])
+            written += 1
+
+    scheduler = simulation.scheduler
+    for entity, due, interval in SPAWNER.iter_unpack(
+        snapshot[offset : offset + SPAWNER.size * spawner_count]
+    ):
+        timer = entity_processor.spawn_timers.get(entity)
+        if timer is None:
+            raise ValueError(f"Spawner {entity} is not in the world")
+        timer.interval = interval
+        if timer.due != due or not timer.active:
+            scheduler.reschedule(timer, due)
+    offset += SPAWNER.size * spawner_count
+
+    records = {
+        values[0]: values
+        for values in SKELETON.iter_unpack(
+            memoryview(snapshot)[
+                offset : offset + SKELETON.size * skeleton_count
+            ]
+        )
+    }
+    skeletons = world.query(*SKELETON_COMPONENTS).rows
+    for entity in skeletons.keys() - records.keys():
+        entity_processor.kill_skeleton(entity)
+        spatial_index.remove(entity)
+        written += 1
+
+    created = False
+    for entity, values in records.items():
+        row = skeletons.get(entity)
+        if row is None:
+            entity_processor.add_skeleton(
+                entity_processor.skeleton_pool.acquire(), values[3:5], entity
+            )
+            row = skeletons[entity]
+            created = True
+        elif _skeleton_values(entity, row) == values:
+            continue
+
+        _restore_skeleton(row, values)
+        if motion_store is not None:
+            motion_store.speed[motion_store.index[entity]] = values[2]
+        spatial_index.move(entity, values[3], values[4])
+        written += 1
+
+    simulation.ticks = ticks
+    scheduler.now = now
+    simulation.accumulator = accumulator
+    world.last_entity_id = last_entity_id
+    entity_processor.skeleton_gen_count = gen_count
+    entity_processor.spawn_slowdown = spawn_slowdown
+    entity_processor.spawned = spawned
+    entity_processor.killed = killed
+    if created:
+        # Brought back skeletons go in where they were created
+        world.sort_queries()
+    # Positions before the restore would interpolate across it
+    simulation.movement_processor.reset_history()
+    simulation.collision_processor.update_skeleton_index()
+    return written
@@ -0,0 +1,100 @@
+"""
+This file is a part of the 'ecs-pygame' source code.
+The source code is distributed under the MIT license.
+"""
+
+from typing import Iterator
+
+import pygame
+
+
+class SpatialHash:
+    """
+    Buckets entities by the grid cell their position falls in, so that a
+    region can be queried without going over every entity.
+    """
+
+    CELL_SIZE = 64
+    # Half of the neighbouring cells, so that each pair is seen once
+    FORWARD_CELLS = ((1, 0), (-1, 1), (0, 1), (1, 1))
+
+    def __init__(self, cell_size: int = CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], set[int]] = {}
+        self.entities: dict[int, tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def __contains__(self, entity: int) -> bool:
+        return entity in self.entities
+
+    def cell_of(self, x: float, y: float) -> tuple[int, int]:
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def move(self, entity: int, x: float, y: float):
+        """
+        Inserts the entity at (x, y), or moves it there.
+        """
+        cell = int(x // self.cell_size), int(y // self.cell_size)
+        old_cell = self.entities.get(entity)
+        if old_cell == cell:
+            return
+        if old_cell is not None:
+            self._discard(entity, old_cell)
+        self.entities[entity] = cell
+        bucket = self.cells.get(cell)
+        if bucket is None:
+            bucket = self.cells[cell] = set()
+        bucket.add(entity)
+
+    def _discard(self, entity: int, cell: tuple[int, int]):
+        bucket = self.cells[cell]
+        bucket.discard(entity)
+        if not bucket:
+            del self.cells[cell]
+
+    def remove(self, entity: int):
+        cell = self.entities.pop(entity, None)
+        if cell is not None:
+            self._discard(entity, cell)
+
+    def query(self, rect: pygame.Rect) -> Iterator[int]:
+        """
+        :return: Entities in the cells `rect` overlaps, which can include
+        some just outside of it
+        """
+        left, top = self.cell_of(rect.left, rect.top)
+        right, bottom = self.cell_of(rect.right - 1, rect.bottom - 1)
+        if (right - left + 1) * (bottom - top + 1) > len(self.cells):
+            # Fewer occupied cells than cells in the area
+            for (col, row), bucket in self.cells.items():
+                if left <= col <= right and top <= row <= bottom:
+                    yield from bucket
+            return
+
+        cells = self.cells
+        for row in range(top, bottom + 1):
+            for col in range(left, right + 1):
+                bucket = cells.get((col, row))
+                if bucket is not None:
+                    yield from bucket
+
+    def pairs(self) -> Iterator[tuple[int, int]]:
+        """
+        :return: Every pair of entities in the same or adjacent cells,
+        once. With cells at least as big as the entities, this includes
+        every pair that can overlap.
+        """
+        cells = self.cells
+        for (col, row), bucket in cells.items():
+            members = tuple(bucket)
+            for index, entity in enumerate(members):
+                for other in members[index + 1 :]:
+                    yield entity, other
+            for step_col, step_row in self.FORWARD_CELLS:
+                neighbours = cells.get((col + step_col, row + step_row))
+                if neighbours is not None:
+                    for entity in members:
+                        for other in neighbours:
+                            yield entity, other
@@ -3,15 +3,25 @@ This file is a part of the 'ecs-pygame' source code.
 The source code is distributed under the MIT license.
 """
 
+import hashlib
 import json
 import logging
-import time
+import os
+import struct
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Optional
 
 import pygame
 
 logger = logging.getLogger()
 
+ASSET_CACHE_DIR = Path(".cache/assets")
+# Bump when the cache file layout changes
+ASSET_CACHE_VERSION = 1
+
 
 def get_images(
     sheet: pygame.surface.Surface,
@@ -38,49 +48,220 @@ def get_images(
     return images
 
 
-def load_assets(state: str, screen: pygame.Surface) -> dict:
+class RotationCache:
+    """
+    Memoizes rotated copies of an image, with angles quantized into
+    `steps` buckets per full turn. At most `max_size` rotations are kept,
+    the least recently used ones are dropped first.
+    """
+
+    def __init__(
+        self,
+        image: pygame.Surface,
+        steps: int = 360,
+        max_size: Optional[int] = None,
+    ):
+        self.image = image
+        self.steps = steps
+        self.step_angle = 360 / steps
+        self.max_size = steps if max_size is None else max_size
+        self.rotations: OrderedDict[int, pygame.Surface] = OrderedDict()
+
+    def bucket(self, angle: float) -> int:
+        """
+        :param angle: Angle in degrees, counter-clockwise
+        :return: Index of the quantized angle
+        """
+        return round(angle / self.step_angle) % self.steps
+
+    def get(self, angle: float) -> pygame.Surface:
+        bucket = self.bucket(angle)
+        try:
+            self.rotations.move_to_end(bucket)
+            return self.rotations[bucket]
+        except KeyError:
+            pass
+
+        rotated = pygame.transform.rotate(self.image, bucket * self.step_angle)
+        self.rotations[bucket] = rotated
+        if len(self.rotations) > self.max_size:
+            self.rotations.popitem(last=False)
+        return rotated
+
+    def precompute(self):
+        for bucket in range(min(self.steps, self.max_size)):
+            self.get(bucket * self.step_angle)
+
+
+def _cache_key(image_path: Path, data: dict) -> str:
+    stat = image_path.stat()
+    key = json.dumps(
+        [
+            ASSET_CACHE_VERSION,
+            str(image_path),
+            stat.st_mtime_ns,
+            stat.st_size,
+            data,
+        ],
+        sort_keys=True,
+    )
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _read_frames(
+    cache_file: Path, pixel_format: str
+) -> Optional[list[tuple[tuple[int, int], bytes]]]:
+    """
+    :return: The cached frames, or None if the file is cut short or
+    otherwise doesn't match the pixel format
+    """
+    frames = []
+    try:
+        with open(cache_file, "rb") as f:
+            (count,) = struct.unpack("<I", f.read(4))
+            for _ in range(count):
+                width, height, length = struct.unpack("<HHI", f.read(8))
+                pixels = f.read(length)
+                if len(pixels) != length or length != (
+                    width * height * len(pixel_format)
+                ):
+                    return None
+                frames.append(((width, height), pixels))
+            if f.read(1):
+                return None
+    except (struct.error, ValueError):
+        return None
+    return frames
+
+
+def _write_frames(
+    cache_file: Path, frames: list[tuple[tuple[int, int], bytes]]
+):
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    # Unique, as several processes can fill the cache at once
+    with tempfile.NamedTemporaryFile(
+        dir=cache_file.parent, suffix=".tmp", delete=False
+    ) as f:
+        try:
+            f.write(struct.pack("<I", len(frames)))
+            for (width, height), pixels in frames:
+                f.write(struct.pack("<HHI", width, height, len(pixels)))
+                f.write(pixels)
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, cache_file)
+
+
+def _decode_asset(
+    image_path: Path, data: dict, pixel_format: str
+) -> tuple[list[tuple[tuple[int, int], bytes]], bool]:
+    """
+    Runs in a worker thread. Reads the raw pixels of every frame of the
+    asset from the cache, or decodes, slices and caches them on a miss.
+
+    :return: The frames and whether they came from the cache
+    """
+    cache_file = ASSET_CACHE_DIR / f"{_cache_key(image_path, data)}.bin"
+    if cache_file.exists():
+        try:
+            frames = _read_frames(cache_file, pixel_format)
+        except OSError:
+            frames = None
+        if frames is not None:
+            return frames, True
+        logger.warning(f"Ignoring corrupt asset cache {cache_file}")
+
+    image = pygame.image.load(image_path)
+    if data["sprite_sheet"] is None:
+        images = [image]
+    else:
+        images = get_images(image, *data["sprite_sheet"].values())
+
+    frames = [
+        (frame.get_size(), pygame.image.tobytes(frame, pixel_format))
+        for frame in images
+    ]
+    try:
+        _write_frames(cache_file, frames)
+    except OSError:
+        logger.warning(f"Couldn't write asset cache {cache_file}")
+    return frames, False
+
+
+def _draw_loading_bar(screen: pygame.Surface, font, progress: float):
+    back_rect = pygame.Rect(0, 0, screen.get_width() * 3 // 4, 50)
+    back_rect.center = screen.get_rect().center
+    fore_rect = pygame.Rect(0, 0, back_rect.width * progress, 50)
+    fore_rect.midleft = back_rect.midleft
+    loading_text = font.render("Loading...", True, (25, 25, 25))
+
+    screen.fill("black")
+    screen.blit(
+        loading_text, loading_text.get_rect(midbottom=back_rect.midtop)
+    )
+    pygame.draw.rect(screen, (25, 25, 25), back_rect)
+    pygame.draw.rect(screen, "white", fore_rect)
+    pygame.display.flip()
+
+
+def load_assets(state: str, screen: Optional[pygame.Surface] = None) -> dict:
+    """
+    Loads every sprite listed in the metadata files for `state`. Decoded
+    and sliced frames are cached on disk, keyed by the image's mtime and
+    its metadata entry, so warm starts skip PNG decoding. Cache misses are
+    decoded on a thread pool.
+
+    :param screen: Shows the loading progress. Without one, nothing is
+    drawn and the images are not converted to a display format.
+    """
     assets = {}
     path = Path("assets/sprites/")
 
-    json_files = path.rglob("*.json")
-    total_files = len(tuple(json_files))
-    loading_back_rect = pygame.Rect(0, 0, 800, 50)
-    loading_fore_rect = pygame.Rect(0, 0, 0, 50)
-    total_rect_width = loading_back_rect.width
-    width_mult = total_files / total_rect_width
-    width = total_rect_width
-    loading_back_rect.center = screen.get_rect().center
-    loading_fore_rect.midleft = loading_back_rect.midleft
-    font = pygame.font.Font(None, 50)
-    loading_text = font.render("Loading...", True, (25, 25, 25))
-    r = loading_text.get_rect(midbottom=loading_back_rect.midtop)
+    entries = []
     for metadata_f in path.rglob("*.json"):
         metadata = json.loads(metadata_f.read_text())
         for file, data in metadata.items():
-            if state not in data["states"]:
-                continue
+            if state in data["states"]:
+                entries.append((metadata_f.parent / file, file, data))
 
-            complete_path = metadata_f.parent / file
-            logger.info(f"Loaded {complete_path}")
-            if data["convert_alpha"]:
-                image = pygame.image.load(complete_path).convert_alpha()
-            else:
-                image = pygame.image.load(complete_path).convert()
+    if screen is not None:
+        font = pygame.font.Font(None, 50)
+        _draw_loading_bar(screen, font, 0)
+    with ThreadPoolExecutor() as executor:
+        futures = {
+            executor.submit(
+                _decode_asset,
+                image_path,
+                data,
+                "RGBA" if data["convert_alpha"] else "RGB",
+            ): (image_path, file, data)
+            for image_path, file, data in entries
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            image_path, file, data = futures[future]
+            frames, cached = future.result()
+            logger.info(
+                f"Loaded {image_path}" + (" from cache" if cached else "")
+            )
 
-            if data["sprite_sheet"] is None:
-                asset = image
-            else:
-                asset = get_images(image, *data["sprite_sheet"].values())
+            images = []
+            for size, pixels in frames:
+                if data["convert_alpha"]:
+                    image = pygame.image.frombytes(pixels, size, "RGBA")
+                    if screen is not None:
+                        image = image.convert_alpha()
+                else:
+                    image = pygame.image.frombytes(pixels, size, "RGB")
+                    if screen is not None:
+                        image = image.convert()
+                images.append(image)
 
+            asset = images[0] if data["sprite_sheet"] is None else images
             file_extension = file[file.find(".") :]
             assets[file.replace(file_extension, "")] = asset
-        screen.fill("black")
-        width += total_rect_width * total_files
-        # time.sleep(0.1)
-        loading_fore_rect.width = width * width_mult
-        screen.blit(loading_text, r)
-        pygame.draw.rect(screen, (25, 25, 25), loading_back_rect)
-        pygame.draw.rect(screen, "white", loading_fore_rect)
-        pygame.display.flip()
+            if screen is not None:
+                _draw_loading_bar(screen, font, done / len(entries))
 
     return assets
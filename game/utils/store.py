@@ -0,0 +1,304 @@
+"""
+This file is a part of the 'ecs-pygame' source code.
+The source code is distributed under the MIT license.
+"""
+
+from typing import Sequence
+
+import esper
+import pygame
+
+from game.components import Movement, Pos
+from game.generics import Vec
+from game.utils.maps import TileLayer
+from game.utils.pathfinding import FlowField
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the store is disabled without it
+    np = None
+
+
+def _collides(tile_layer: TileLayer, left, top, width, height) -> "np.ndarray":
+    """
+    :return: Whether each rect overlaps a solid tile
+    """
+    size = tile_layer.tile_size
+    first_col = np.maximum(left // size, 0)
+    last_col = np.minimum((left + width - 1) // size, tile_layer.width - 1)
+    first_row = np.maximum(top // size, 0)
+    last_row = np.minimum((top + height - 1) // size, tile_layer.height - 1)
+    hit = np.zeros(len(left), dtype=bool)
+    full = (width > 0) & (height > 0)
+    if not full.any():
+        return hit
+
+    tiles = np.frombuffer(tile_layer.tiles, dtype=np.uint8)
+    solid = np.array(sorted(tile_layer.SOLID_TILES))
+    # Rects rarely span more than a couple of tiles either way
+    rows = int((last_row - first_row)[full].max()) + 1
+    cols = int((last_col - first_col)[full].max()) + 1
+    for row_step in range(rows):
+        row = first_row + row_step
+        for col_step in range(cols):
+            col = first_col + col_step
+            inside = full & (row <= last_row) & (col <= last_col)
+            index = np.where(inside, row * tile_layer.width + col, 0)
+            hit |= inside & np.isin(tiles[index], solid)
+    return hit
+
+
+class ArrayVector:
+    """
+    Per-entity view into one row of a `MotionStore` column. Behaves like
+    the `pygame.Vector2` components it stands in for. The store rebinds
+    `row` whenever the underlying array moves.
+    """
+
+    __slots__ = ("row",)
+
+    def __init__(self, row):
+        self.row = row
+
+    @property
+    def x(self) -> float:
+        return self.row[0]
+
+    @x.setter
+    def x(self, value: float):
+        self.row[0] = value
+
+    @property
+    def y(self) -> float:
+        return self.row[1]
+
+    @y.setter
+    def y(self, value: float):
+        self.row[1] = value
+
+    def __len__(self) -> int:
+        return 2
+
+    def __getitem__(self, item: int) -> float:
+        return self.row[item]
+
+    def __iter__(self):
+        return iter(self.row)
+
+    def __add__(self, other: Vec) -> Vec:
+        x, y = other
+        return Vec(self.row[0] + x, self.row[1] + y)
+
+    def __sub__(self, other: Vec) -> Vec:
+        x, y = other
+        return Vec(self.row[0] - x, self.row[1] - y)
+
+    def __iadd__(self, other: Vec) -> "ArrayVector":
+        x, y = other
+        self.row += x, y
+        return self
+
+    def copy(self) -> Vec:
+        return Vec(self.row[0], self.row[1])
+
+    def __repr__(self) -> str:
+        return f"<ArrayVector({self.x}, {self.y})>"
+
+
+class MotionStore:
+    """
+    Struct-of-arrays storage for the positions, velocities and speeds of
+    many entities, so they can be moved in one vectorized pass.
+    """
+
+    INITIAL_CAPACITY = 256
+    # Cell of the rows not yet in any spatial hash
+    UNINDEXED = -(2**62)
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        if np is None:
+            raise RuntimeError("MotionStore requires numpy")
+
+        self.pos = np.zeros((capacity, 2))
+        # Positions before the latest integrate, for render interpolation
+        self.prev = np.zeros((capacity, 2))
+        self.vel = np.zeros((capacity, 2))
+        self.speed = np.zeros(capacity)
+        self.offset = np.zeros((capacity, 2))
+        # Spatial hash cell each row was last indexed in, see `moved_rows`
+        self.cells = np.full((capacity, 2), self.UNINDEXED, dtype=np.int64)
+        self.entities: list[int] = []
+        self.views: list[tuple[ArrayVector, ArrayVector]] = []
+        self.index: dict[int, int] = {}
+
+    @staticmethod
+    def is_available() -> bool:
+        return np is not None
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def __contains__(self, entity: int) -> bool:
+        return entity in self.index
+
+    def _grow(self):
+        capacity = len(self.pos) * 2
+        for column in ("pos", "prev", "vel", "speed", "offset", "cells"):
+            old = getattr(self, column)
+            new = np.zeros((capacity, *old.shape[1:]), dtype=old.dtype)
+            new[: len(old)] = old
+            setattr(self, column, new)
+        self._rebind(range(len(self.entities)))
+
+    def _rebind(self, indices):
+        for i in indices:
+            pos_view, vel_view = self.views[i]
+            pos_view.row = self.pos[i]
+            vel_view.row = self.vel[i]
+
+    def add(
+        self,
+        world: esper.World,
+        entity: int,
+        pos: Vec,
+        movement: Vec = (0, 0),
+        speed: float = 0.0,
+        offset: Vec = (0, 0),
+    ):
+        """
+        Moves the entity's position and velocity into the store and gives
+        it views registered as its `Pos` and `Movement` components.
+
+        :param offset: Point steered from, relative to the position
+        """
+        i = len(self.entities)
+        if i == len(self.pos):
+            self._grow()
+
+        self.pos[i] = self.prev[i] = pos[0], pos[1]
+        self.vel[i] = movement[0], movement[1]
+        self.speed[i] = speed
+        self.offset[i] = offset[0], offset[1]
+        self.cells[i] = self.UNINDEXED
+        views = ArrayVector(self.pos[i]), ArrayVector(self.vel[i])
+        self.entities.append(entity)
+        self.views.append(views)
+        self.index[entity] = i
+
+        world.add_component(entity, views[0], type_alias=Pos)
+        world.add_component(entity, views[1], type_alias=Movement)
+
+    def remove(self, entity: int):
+        """
+        Drops the entity's row, moving the last row into the gap. The
+        entity's views keep a detached copy of their last values.
+        """
+        i = self.index.pop(entity)
+        for view in self.views[i]:
+            view.row = view.row.copy()
+        last = len(self.entities) - 1
+        if i != last:
+            for column in (
+                self.pos,
+                self.prev,
+                self.vel,
+                self.speed,
+                self.offset,
+                self.cells,
+            ):
+                column[i] = column[last]
+            moved = self.entities[i] = self.entities[last]
+            self.views[i] = self.views[last]
+            self._rebind((i,))
+            self.index[moved] = i
+        self.entities.pop()
+        self.views.pop()
+
+    def integrate(self):
+        n = len(self.entities)
+        self.prev[:n] = self.pos[:n]
+        self.pos[:n] += self.vel[:n]
+
+    def moved_rows(self, cell_size: int) -> list[int]:
+        """
+        Records the cell every position is in.
+
+        :return: Rows whose position left the cell recorded for it, or
+        that had none, for a spatial hash with cells of `cell_size`
+        """
+        n = len(self.entities)
+        cells = np.floor_divide(self.pos[:n], cell_size).astype(np.int64)
+        moved = np.flatnonzero((cells != self.cells[:n]).any(axis=1))
+        self.cells[:n] = cells
+        return moved.tolist()
+
+    def unindex(self):
+        """
+        Makes `moved_rows` return every row, for when the spatial hash was
+        changed behind the store's back.
+        """
+        self.cells[:] = self.UNINDEXED
+
+    def interpolate(self, alpha: float) -> list[list[float]]:
+        """
+        :param alpha: How far between `prev` (0) and `pos` (1)
+        :return: Positions blended in between, by row
+        """
+        n = len(self.entities)
+        prev = self.prev[:n]
+        return (prev + (self.pos[:n] - prev) * alpha).tolist()
+
+    def stop_at_tiles(
+        self, tile_layer: TileLayer, rects: Sequence[pygame.Rect]
+    ) -> list[list[float]]:
+        """
+        Zeroes each velocity along the axes that would move the row's rect
+        into a solid tile, as `TileLayer.collides` would see it.
+
+        :param rects: Rect of each row
+        :return: Where each row will be after the next integrate
+        """
+        n = len(self.entities)
+        vel = self.vel[:n]
+        if n:
+            left, top, width, height = np.array(rects, dtype=np.int64).T
+            # pygame.Rect truncates the floats it is made from
+            moved_left = np.trunc(left + vel[:, 0]).astype(np.int64)
+            moved_top = np.trunc(top + vel[:, 1]).astype(np.int64)
+            vel[_collides(tile_layer, moved_left, top, width, height), 0] = 0
+            vel[_collides(tile_layer, left, moved_top, width, height), 1] = 0
+        return (self.pos[:n] + vel).tolist()
+
+    def chase(self, target: Vec, dt: float, flow_field: FlowField = None):
+        """
+        Points every velocity towards the target at the entity's speed,
+        following the flow field's waypoints where it has one.
+        """
+        n = len(self.entities)
+        pos = self.pos[:n]
+        delta = np.subtract((target[0], target[1]), pos)
+
+        if flow_field is not None and n:
+            origin = pos + self.offset[:n]
+            cells = np.floor_divide(origin, flow_field.tile_size).astype(int)
+            # Skeletons crowd together, so few cells are looked up. Each
+            # cell is keyed by one int, much faster to unique than rows.
+            keys = cells[:, 1] * 2**32 + cells[:, 0]
+            _, first, inverse = np.unique(
+                keys, return_index=True, return_inverse=True
+            )
+            unique = cells[first]
+            nan = (np.nan, np.nan)
+            waypoints = np.array(
+                [
+                    flow_field.cell_waypoint(col, row) or nan
+                    for col, row in unique.tolist()
+                ]
+            )[inverse.reshape(-1)]
+            follow = ~np.isnan(waypoints[:, 0])
+            delta[follow] = waypoints[follow] - origin[follow]
+
+        angle = np.arctan2(delta[:, 1], delta[:, 0])
+        step = self.speed[:n] * dt
+        self.vel[:n, 0] = np.cos(angle) * step
+        self.vel[:n, 1] = np.sin(angle) * step
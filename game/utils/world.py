@@ -0,0 +1,180 @@
+"""
+This file is a part of the 'ecs-pygame' source code.
+The source code is distributed under the MIT license.
+"""
+
+from typing import Any, Iterator, Optional
+
+import esper
+
+
+class Query:
+    """
+    Persistent view of the entities that have all of `component_types`.
+    The world keeps it up to date as components are added and removed.
+    """
+
+    def __init__(self, component_types: tuple[type, ...]):
+        self.component_types = component_types
+        self.rows: dict[int, tuple] = {}
+        # Snapshot to iterate over, so the view can change while in use
+        self._items: Optional[list[tuple[int, tuple]]] = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, entity: int) -> bool:
+        return entity in self.rows
+
+    def __iter__(self) -> Iterator[tuple[int, tuple]]:
+        if self._items is None:
+            self._items = list(self.rows.items())
+        return iter(self._items)
+
+    def refresh(self, entity: int, components: dict[type, Any]):
+        """
+        Adds, updates or drops the entity depending on its components.
+        """
+        try:
+            row = tuple(components[ct] for ct in self.component_types)
+        except KeyError:
+            self.discard(entity)
+            return
+        self.rows[entity] = row
+        self._items = None
+
+    def discard(self, entity: int):
+        if self.rows.pop(entity, None) is not None:
+            self._items = None
+
+    def clear(self):
+        self.rows.clear()
+        self._items = None
+
+    def sort(self):
+        """
+        Puts the rows back in order of entity id, the order they were
+        created in.
+        """
+        items = sorted(self.rows.items())
+        self.rows.clear()
+        self.rows.update(items)
+        self._items = None
+
+
+class World(esper.World):
+    """
+    `esper.World` with cached queries. `query` returns the same view for
+    the same component types, which is updated incrementally instead of
+    being rebuilt after every change like `get_components`.
+    """
+
+    def __init__(self, timed: bool = False):
+        super().__init__(timed)
+        self._queries: dict[tuple[type, ...], Query] = {}
+        self._queries_by_type: dict[type, list[Query]] = {}
+
+    @property
+    def last_entity_id(self) -> int:
+        """
+        Highest id handed out so far, new entities count up from it.
+        """
+        return self._next_entity_id
+
+    @last_entity_id.setter
+    def last_entity_id(self, entity: int):
+        self._next_entity_id = entity
+
+    @property
+    def entity_count(self) -> int:
+        """
+        Entities in the world, including deleted ones not yet cleared.
+        """
+        return len(self._entities)
+
+    def entities(self) -> Iterator[tuple[int, dict[type, Any]]]:
+        """
+        :return: Every entity with its components by type, which must not
+        be changed through it
+        """
+        return iter(self._entities.items())
+
+    def query(self, *component_types: type) -> Query:
+        query = self._queries.get(component_types)
+        if query is not None:
+            return query
+
+        query = self._queries[component_types] = Query(component_types)
+        for component_type in component_types:
+            self._queries_by_type.setdefault(component_type, []).append(query)
+        for entity in set.intersection(
+            *(self._components.get(ct, set()) for ct in component_types)
+        ):
+            query.refresh(entity, self._entities[entity])
+        return query
+
+    def _refresh(self, entity: int, component_types):
+        components = self._entities[entity]
+        refreshed = set()
+        for component_type in component_types:
+            for query in self._queries_by_type.get(component_type, ()):
+                if id(query) not in refreshed:
+                    refreshed.add(id(query))
+                    query.refresh(entity, components)
+
+    def _discard(self, entity: int):
+        for component_type in self._entities[entity]:
+            for query in self._queries_by_type.get(component_type, ()):
+                query.discard(entity)
+
+    def clear_database(self):
+        super().clear_database()
+        for query in self._queries.values():
+            query.clear()
+
+    def create_entity(self, *components, entity: Optional[int] = None) -> int:
+        """
+        :param entity: Id to give the entity, for bringing back one that
+        was deleted. Defaults to the next unused id.
+        """
+        if entity is None:
+            entity = super().create_entity(*components)
+        else:
+            if entity in self._entities:
+                raise ValueError(f"Entity {entity} already exists")
+            next_entity_id = self._next_entity_id
+            self._next_entity_id = entity - 1
+            super().create_entity(*components)
+            self._next_entity_id = max(next_entity_id, entity)
+        self._refresh(entity, map(type, components))
+        return entity
+
+    def sort_queries(self):
+        """
+        Orders every query by entity id, after entities were brought back
+        with `create_entity(entity=...)`.
+        """
+        for query in self._queries.values():
+            query.sort()
+
+    def delete_entity(self, entity: int, immediate: bool = False):
+        if immediate:
+            self._discard(entity)
+        super().delete_entity(entity, immediate)
+
+    def add_component(
+        self, entity: int, component_instance, type_alias: type = None
+    ):
+        super().add_component(entity, component_instance, type_alias)
+        self._refresh(entity, (type_alias or type(component_instance),))
+
+    def remove_component(self, entity: int, component_type: type):
+        component = super().remove_component(entity, component_type)
+        for query in self._queries_by_type.get(component_type, ()):
+            query.discard(entity)
+        return component
+
+    def _clear_dead_entities(self):
+        for entity in self._dead_entities:
+            self._discard(entity)
+        super()._clear_dead_entities()